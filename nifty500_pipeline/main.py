@@ -13,30 +13,48 @@ Author: Quantitative Infrastructure Team
 """
 
 import sys
+import queue
+import atexit
 import logging
+from logging.handlers import MemoryHandler
 from pathlib import Path
 from datetime import datetime
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 # Add scripts directory to path
 sys.path.insert(0, str(Path(__file__).parent / 'scripts'))
 
 # Import pipeline modules
 from fetch_tickers import NIFTY500Fetcher
-from download_data import NIFTY500Downloader
-from clean_data import NIFTY500DataCleaner
+from download_data import NIFTY500Downloader, DOWNLOAD_ENGINES
+from clean_data import NIFTY500DataCleaner, OUTPUT_FORMATS
+from utils import ensure_dirs
+
+# Configure logging (file records are buffered and written in batches,
+# flushed on ERROR and at exit)
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+ensure_dirs(('logs',))
+file_handler = logging.FileHandler('logs/pipeline.log')
+file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+buffered_file_handler = MemoryHandler(capacity=512, flushLevel=logging.ERROR,
+                                      target=file_handler)
+atexit.register(buffered_file_handler.flush)
 
-# Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler('logs/pipeline.log'),
+        buffered_file_handler,
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Downloaded frames buffered between Stage 2 and Stage 3 in overlap mode
+FRAME_QUEUE_SIZE = 32
+
 
 class NIFTY500Pipeline:
     """
@@ -51,7 +69,9 @@ class NIFTY500Pipeline:
     WARNING: Data contains survivorship bias (only current constituents)
     """
     
-    def __init__(self, start_date='2000-01-01', end_date=None, max_retries=3):
+    def __init__(self, start_date='2000-01-01', end_date=None, max_retries=3,
+                 output_format='parquet', use_cache=True, overlap=False,
+                 engine='yfinance', include_actions=False, update_mode=False):
         """
         Initialize the pipeline.
         
@@ -59,10 +79,28 @@ class NIFTY500Pipeline:
             start_date (str): Start date for historical data (YYYY-MM-DD)
             end_date (str): End date (defaults to today)
             max_retries (int): Max retry attempts for downloads
+            output_format (str): Processed data format: 'parquet', 'csv' or 'both'
+            use_cache (bool): Reuse a ticker list fetched within a day and
+                per-ticker price history cached in data/cache
+            overlap (bool): In the full pipeline, clean each ticker while the
+                rest are still downloading (no raw data snapshot is written)
+            engine (str): Download engine: 'yfinance', 'async' or 'pool'
+            include_actions (bool): Keep Dividends and Stock Splits columns
+            update_mode (bool): Append only new bars to the existing raw data
+                dataset instead of downloading full histories (not with overlap)
         """
+        if update_mode and overlap:
+            raise ValueError("update_mode cannot be combined with overlap")
+        
         self.start_date = start_date
         self.end_date = end_date
         self.max_retries = max_retries
+        self.output_format = output_format
+        self.use_cache = use_cache
+        self.overlap = overlap
+        self.engine = engine
+        self.include_actions = include_actions
+        self.update_mode = update_mode
         
         # Ensure all directories exist
         self._setup_directories()
@@ -71,18 +109,20 @@ class NIFTY500Pipeline:
         self.tickers = []
         self.raw_data = None
         self.clean_data = None
+        self.processed_files = {}
+        self.raw_snapshot = None
+        self.records_downloaded = 0
+        self.records_cleaned = 0
         
     def _setup_directories(self):
-        """Create necessary directories."""
-        directories = [
+        """Create necessary directories (once per process)."""
+        ensure_dirs((
             'data/raw',
             'data/processed',
             'data/reports',
+            'data/cache',
             'logs'
-        ]
-        
-        for directory in directories:
-            Path(directory).mkdir(parents=True, exist_ok=True)
+        ))
     
     def run_stage_1_fetch_tickers(self):
         """
@@ -96,9 +136,13 @@ class NIFTY500Pipeline:
         logger.info("=" * 80)
         
         try:
-            fetcher = NIFTY500Fetcher(output_dir='data/raw')
+            fetcher = NIFTY500Fetcher(output_dir='data/raw', use_cache=self.use_cache)
+            
             self.tickers = fetcher.fetch_tickers()
-            fetcher.save_tickers(self.tickers)
+            
+            # A cached list is left untouched so that its age is kept
+            if not fetcher.loaded_from_cache:
+                fetcher.save_tickers(self.tickers)
             
             logger.info(f"✓ Stage 1 completed: {len(self.tickers)} tickers fetched")
             return self.tickers
@@ -107,12 +151,17 @@ class NIFTY500Pipeline:
             logger.error(f"✗ Stage 1 FAILED: {e}")
             raise
     
-    def run_stage_2_download_data(self):
+    def run_stage_2_download_data(self, background_save=False):
         """
         Stage 2: Download historical data for all tickers.
         
+        Args:
+            background_save (bool): Write the raw data snapshot in a background
+                thread (see self.raw_snapshot) instead of blocking on it
+        
         Returns:
-            pd.DataFrame: Raw downloaded data
+            pd.DataFrame or None: Raw downloaded data (None in update mode,
+            where new bars are appended to the raw dataset on disk)
         """
         logger.info("=" * 80)
         logger.info("STAGE 2: DOWNLOADING HISTORICAL DATA")
@@ -122,17 +171,42 @@ class NIFTY500Pipeline:
             downloader = NIFTY500Downloader(
                 start_date=self.start_date,
                 end_date=self.end_date,
-                max_retries=self.max_retries
+                max_retries=self.max_retries,
+                engine=self.engine,
+                use_cache=self.use_cache,
+                include_actions=self.include_actions,
+                update_mode=self.update_mode
             )
             
             # Load tickers from file
             tickers = downloader.load_tickers()
             
+            if self.update_mode:
+                # Append new bars to the raw dataset; Stage 3 reads it from disk
+                downloader.download_all(tickers, stream_to_disk=True)
+                self.records_downloaded = downloader.stats['records']
+                downloader.save_download_report()
+                downloader.print_summary()
+                
+                logger.info(f"✓ Stage 2 completed: {self.records_downloaded} new records downloaded")
+                return None
+            
             # Download data
             self.raw_data = downloader.download_all(tickers)
+            self.records_downloaded = len(self.raw_data)
+            
+            if self.raw_data.empty:
+                # Keep the previous raw data snapshot rather than replacing it
+                downloader.save_download_report()
+                raise RuntimeError("No data downloaded for any ticker")
             
             # Save and report
-            downloader.save_raw_data(self.raw_data)
+            if background_save:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='raw-snapshot')
+                self.raw_snapshot = executor.submit(downloader.save_raw_data, self.raw_data)
+                executor.shutdown(wait=False)
+            else:
+                downloader.save_raw_data(self.raw_data)
             downloader.save_download_report()
             downloader.print_summary()
             
@@ -155,25 +229,32 @@ class NIFTY500Pipeline:
         logger.info("=" * 80)
         
         try:
-            cleaner = NIFTY500DataCleaner()
+            cleaner = NIFTY500DataCleaner(output_format=self.output_format)
             
-            # Load raw data
+            # Load raw data (handed over in memory when Stage 2 ran in this process)
+            if self.raw_data is not None:
+                cleaner.set_raw_data(self.raw_data)
             df = cleaner.load_raw_data()
+            df = cleaner.downcast_dtypes(df)
             
             # Clean
             df = cleaner.remove_duplicates(df)
             df = cleaner.sort_data(df)
             df = cleaner.handle_missing_values(df)
             df = cleaner.validate_data(df)
-            df = cleaner.add_metadata_columns(df)
+            
+            # One Date factorization shared by the remaining steps
+            date_factorization = cleaner.factorize_dates(df)
+            df = cleaner.add_metadata_columns(df, date_factorization)
             
             # Calculate stats and save
-            cleaner.calculate_statistics(df)
-            cleaner.save_processed_data(df)
+            cleaner.calculate_statistics(df, date_factorization)
+            self.processed_files = cleaner.save_processed_data(df, date_factorization)
             cleaner.save_quality_report()
             cleaner.print_summary()
             
             self.clean_data = df
+            self.records_cleaned = len(df)
             
             logger.info(f"✓ Stage 3 completed: {len(df)} records cleaned")
             return df
@@ -182,6 +263,62 @@ class NIFTY500Pipeline:
             logger.error(f"✗ Stage 3 FAILED: {e}")
             raise
     
+    def run_stages_2_3_overlapped(self):
+        """
+        Stages 2 and 3 overlapped: clean each ticker as soon as it downloads.
+        
+        The downloader puts per-ticker frames on a bounded queue and a consumer
+        thread cleans them and appends them to the master dataset, so the
+        CPU-bound cleaning runs while the network-bound download continues.
+        
+        Returns:
+            dict: Paths to saved processed files
+        """
+        logger.info("=" * 80)
+        logger.info("STAGES 2+3: DOWNLOADING AND CLEANING (OVERLAPPED)")
+        logger.info("=" * 80)
+        
+        try:
+            downloader = NIFTY500Downloader(
+                start_date=self.start_date,
+                end_date=self.end_date,
+                max_retries=self.max_retries,
+                engine=self.engine,
+                use_cache=self.use_cache,
+                include_actions=self.include_actions
+            )
+            cleaner = NIFTY500DataCleaner(output_format=self.output_format)
+            
+            frame_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stream-cleaner')
+            consumer = executor.submit(cleaner.clean_stream, frame_queue)
+            executor.shutdown(wait=False)
+            
+            try:
+                tickers = downloader.load_tickers()
+                downloader.download_all(tickers, frame_queue=frame_queue)
+            finally:
+                # End-of-stream sentinel
+                frame_queue.put(None)
+            
+            self.processed_files = consumer.result()
+            
+            downloader.save_download_report()
+            downloader.print_summary()
+            cleaner.save_quality_report()
+            cleaner.print_summary()
+            
+            self.records_downloaded = downloader.stats['records']
+            self.records_cleaned = cleaner.quality_metrics['final_rows']
+            
+            logger.info(f"✓ Stages 2+3 completed: {self.records_downloaded} records downloaded, "
+                        f"{self.records_cleaned} records cleaned")
+            return self.processed_files
+            
+        except Exception as e:
+            logger.error(f"✗ Stages 2+3 FAILED: {e}")
+            raise
+    
     def run_full_pipeline(self):
         """
         Execute the complete pipeline end-to-end.
@@ -201,11 +338,19 @@ class NIFTY500Pipeline:
             # Stage 1: Fetch tickers
             self.run_stage_1_fetch_tickers()
             
-            # Stage 2: Download data
-            self.run_stage_2_download_data()
-            
-            # Stage 3: Clean data
-            self.run_stage_3_clean_data()
+            if self.overlap:
+                # Stages 2+3: Clean each ticker while the rest download
+                self.run_stages_2_3_overlapped()
+            else:
+                # Stage 2: Download data (raw snapshot is written while Stage 3 runs)
+                self.run_stage_2_download_data(background_save=True)
+                
+                # Stage 3: Clean data
+                self.run_stage_3_clean_data()
+                
+                # Wait for the raw data snapshot (re-raises any write error)
+                if self.raw_snapshot is not None:
+                    self.raw_snapshot.result()
             
             # Pipeline completed
             pipeline_end = datetime.now()
@@ -217,8 +362,8 @@ class NIFTY500Pipeline:
             logger.info("=" * 80)
             logger.info(f"Status:               SUCCESS ✓")
             logger.info(f"Tickers fetched:      {len(self.tickers)}")
-            logger.info(f"Records downloaded:   {len(self.raw_data):,}")
-            logger.info(f"Records cleaned:      {len(self.clean_data):,}")
+            logger.info(f"Records downloaded:   {self.records_downloaded:,}")
+            logger.info(f"Records cleaned:      {self.records_cleaned:,}")
             logger.info(f"Start time:           {pipeline_start.strftime('%Y-%m-%d %H:%M:%S')}")
             logger.info(f"End time:             {pipeline_end.strftime('%Y-%m-%d %H:%M:%S')}")
             logger.info(f"Total duration:       {duration}")
@@ -226,9 +371,9 @@ class NIFTY500Pipeline:
             logger.info("")
             logger.info("OUTPUT FILES:")
             logger.info("  Processed Data:")
-            logger.info("    - data/processed/nifty500_master.csv")
-            logger.info("    - data/processed/nifty500_close_prices.csv")
-            logger.info("    - data/processed/nifty500_volumes.csv")
+            for paths in self.processed_files.values():
+                for path in paths:
+                    logger.info(f"    - {path.as_posix()}")
             logger.info("  Reports:")
             logger.info("    - data/reports/download_summary.json")
             logger.info("    - data/reports/data_quality_report.json")
@@ -241,8 +386,8 @@ class NIFTY500Pipeline:
             return {
                 'status': 'success',
                 'tickers_count': len(self.tickers),
-                'records_downloaded': len(self.raw_data),
-                'records_cleaned': len(self.clean_data),
+                'records_downloaded': self.records_downloaded,
+                'records_cleaned': self.records_cleaned,
                 'duration': str(duration)
             }
             
@@ -273,6 +418,21 @@ Examples:
   # Specify custom date range
   python main.py --start-date 2010-01-01 --end-date 2023-12-31
   
+  # Also write processed data as CSV
+  python main.py --output-format both
+  
+  # Clean each ticker while the remaining tickers download
+  python main.py --overlap
+  
+  # Download with concurrent chart API requests (needs httpx, aiolimiter)
+  python main.py --engine async
+  
+  # Download batches in parallel worker processes
+  python main.py --engine pool
+  
+  # Daily re-run: append only new bars to the existing raw data
+  python main.py --update
+  
   # Run individual stages
   python main.py --stage fetch
   python main.py --stage download
@@ -301,6 +461,47 @@ Examples:
         help='Maximum retry attempts for failed downloads. Default: 3'
     )
     
+    parser.add_argument(
+        '--output-format',
+        type=str,
+        choices=OUTPUT_FORMATS,
+        default='parquet',
+        help='Format for processed data files. Default: parquet'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Ignore cached tickers and price history and download everything again'
+    )
+    
+    parser.add_argument(
+        '--overlap',
+        action='store_true',
+        help='Clean tickers while downloading (full pipeline only; skips the raw data snapshot)'
+    )
+    
+    parser.add_argument(
+        '--engine',
+        type=str,
+        choices=DOWNLOAD_ENGINES,
+        default='yfinance',
+        help='Download engine: batched yf.download, concurrent async requests, or '
+             'batched yf.download in worker processes. Default: yfinance'
+    )
+    
+    parser.add_argument(
+        '--include-actions',
+        action='store_true',
+        help='Keep Dividends and Stock Splits columns (prices are adjusted either way)'
+    )
+    
+    parser.add_argument(
+        '--update',
+        action='store_true',
+        help='Append only bars newer than the existing raw data instead of downloading full histories'
+    )
+    
     parser.add_argument(
         '--stage',
         type=str,
@@ -321,7 +522,13 @@ def main():
     pipeline = NIFTY500Pipeline(
         start_date=args.start_date,
         end_date=args.end_date,
-        max_retries=args.max_retries
+        max_retries=args.max_retries,
+        output_format=args.output_format,
+        use_cache=not args.no_cache,
+        overlap=args.overlap,
+        engine=args.engine,
+        include_actions=args.include_actions,
+        update_mode=args.update
     )
     
     try:
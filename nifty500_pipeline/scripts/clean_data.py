@@ -16,46 +16,188 @@ Author: Quantitative Infrastructure Team
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
+import atexit
 import logging
+from logging.handlers import MemoryHandler
 from pathlib import Path
 from datetime import datetime
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import ensure_dirs
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Copy-on-Write avoids defensive copies between cleaning stages
+# (always enabled from pandas 3.0, where the option is deprecated)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Configure logging (file records are buffered and written in batches,
+# flushed on ERROR and at exit)
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+ensure_dirs(('logs',))
+file_handler = logging.FileHandler('logs/cleaning.log')
+file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+buffered_file_handler = MemoryHandler(capacity=512, flushLevel=logging.ERROR,
+                                      target=file_handler)
+atexit.register(buffered_file_handler.flush)
 
-# Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler('logs/cleaning.log'),
+        buffered_file_handler,
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Supported formats for processed data files
+OUTPUT_FORMATS = ('parquet', 'csv', 'both')
+
+# Rows serialized per chunk when writing processed files
+WRITE_CHUNK_ROWS = 200_000
+
+# Exchange timezone of NSE listings (raw dates carry a +05:30 offset)
+MARKET_TZ = 'Asia/Kolkata'
+
+# Column types for the multi-threaded Arrow CSV reader (Date is inferred so
+# that both offset-aware and naive timestamps parse correctly)
+RAW_CSV_COLUMN_TYPES = {
+    'Ticker': pa.dictionary(pa.int32(), pa.string()),
+    'Open': pa.float32(),
+    'High': pa.float32(),
+    'Low': pa.float32(),
+    'Close': pa.float32(),
+    'Volume': pa.int64(),
+}
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+# Default transaction cost assumption, recorded in the quality report rather
+# than repeated on every row (to be configured per strategy)
+# Typical values: 3 bps (0.03%) for institutional, 10 bps (0.1%) for retail
+TRANSACTION_COST_BPS = 3.0
+
+# Types that json serializes natively (bool is covered by int)
+NATIVE_JSON_TYPES = (str, int, type(None))
+
+
+if NUMBA_AVAILABLE:
+    
+    @njit(parallel=True, cache=True)
+    def _ffill_kernel(prices, group_bounds):
+        """
+        Forward fill NaNs in place, never crossing ticker boundaries.
+        
+        Args:
+            prices (np.ndarray): (rows, columns) price block sorted by Ticker, Date
+            group_bounds (np.ndarray): Start row of each ticker plus the row count
+        """
+        for g in prange(len(group_bounds) - 1):
+            for i in range(group_bounds[g] + 1, group_bounds[g + 1]):
+                for j in range(prices.shape[1]):
+                    if np.isnan(prices[i, j]):
+                        prices[i, j] = prices[i - 1, j]
+    
+    @njit(parallel=True, cache=True)
+    def _validate_kernel(prices, volume, keep):
+        """
+        Flag negative-price rows, clamp negative volume and swap High < Low in
+        place, counting each issue on the rows that are kept.
+        
+        Args:
+            prices (np.ndarray): (rows, 4) Open/High/Low/Close block
+            volume (np.ndarray): Volume per row
+            keep (np.ndarray): Output mask, False for rows with a negative price
+            
+        Returns:
+            tuple: Negative Open/High/Low/Close/Volume, High < Low and Close
+            outside High-Low counts
+        """
+        neg_open = neg_high = neg_low = neg_close = 0
+        neg_volume = invalid_hl = outside_range = 0
+        
+        for i in prange(prices.shape[0]):
+            open_, high, low, close = prices[i, 0], prices[i, 1], prices[i, 2], prices[i, 3]
+            
+            neg_open += 1 if open_ < 0 else 0
+            neg_high += 1 if high < 0 else 0
+            neg_low += 1 if low < 0 else 0
+            neg_close += 1 if close < 0 else 0
+            kept = not (open_ < 0 or high < 0 or low < 0 or close < 0)
+            keep[i] = kept
+            
+            if volume[i] < 0:
+                volume[i] = 0
+                neg_volume += 1 if kept else 0
+            
+            if high < low:
+                prices[i, 1] = low
+                prices[i, 2] = high
+                high, low = low, high
+                invalid_hl += 1 if kept else 0
+            
+            if kept and (close > high or close < low):
+                outside_range += 1
+        
+        return neg_open, neg_high, neg_low, neg_close, neg_volume, invalid_hl, outside_range
+
 
 class NIFTY500DataCleaner:
     """
     Production-grade data cleaning and validation for NIFTY 500 datasets.
+    
+    Cleaning steps mutate the frame in place where possible and must run in
+    pipeline order: remove_duplicates -> sort_data -> handle_missing_values
+    -> validate_data -> add_metadata_columns. In particular,
+    handle_missing_values assumes the frame is already sorted by Ticker and
+    Date (as done by sort_data) and does not re-sort it.
     """
     
-    def __init__(self, raw_data_path='data/raw/nifty500_raw_data.csv',
-                 processed_dir='data/processed', reports_dir='data/reports'):
+    def __init__(self, raw_data_path='data/raw/nifty500_raw_data',
+                 processed_dir='data/processed', reports_dir='data/reports',
+                 output_format='parquet', use_numba=False):
         """
         Initialize the data cleaner.
         
         Args:
-            raw_data_path (str): Path to raw data CSV
+            raw_data_path (str): Path to the raw data Parquet dataset (partitioned
+                by Ticker); a single .parquet or .csv file with the same stem is
+                used as a fallback
             processed_dir (str): Directory for processed data
             reports_dir (str): Directory for quality reports
+            output_format (str): Processed data format: 'parquet', 'csv' or 'both'
+            use_numba (bool): Run forward fill and validation as parallel Numba
+                kernels (falls back to pandas/NumPy if numba is not installed)
         """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Invalid output_format: {output_format!r} "
+                f"(expected one of {', '.join(OUTPUT_FORMATS)})"
+            )
+        
         self.raw_data_path = Path(raw_data_path)
         self.processed_dir = Path(processed_dir)
         self.reports_dir = Path(reports_dir)
+        self.output_format = output_format
+        
+        if use_numba and not NUMBA_AVAILABLE:
+            logger.warning("numba is not installed; using pandas/NumPy cleaning")
+            use_numba = False
+        self.use_numba = use_numba
         
-        # Create directories
-        self.processed_dir.mkdir(parents=True, exist_ok=True)
-        self.reports_dir.mkdir(parents=True, exist_ok=True)
-        Path('logs').mkdir(exist_ok=True)
+        # Create directories (once per process)
+        ensure_dirs((str(self.processed_dir), str(self.reports_dir), 'logs'))
         
         # Data quality metrics
         self.quality_metrics = {
@@ -67,25 +209,117 @@ class NIFTY500DataCleaner:
             'date_range': {},
             'data_quality_score': 0.0
         }
+        
+        # Raw data handed over in memory (see set_raw_data)
+        self.raw_data = None
+    
+    def set_raw_data(self, df):
+        """
+        Provide raw data in memory so load_raw_data skips the disk round-trip.
+        
+        A shallow copy is kept: with Copy-on-Write, cleaning never modifies
+        the caller's frame, which may still be serialized concurrently.
+        
+        Args:
+            df (pd.DataFrame): Raw dataset as returned by the downloader
+        """
+        self.raw_data = df.copy(deep=False)
     
     def load_raw_data(self):
         """
-        Load raw data from CSV file.
+        Load raw data from memory (see set_raw_data) or from the partitioned
+        Parquet dataset, falling back to a single Parquet or legacy CSV file.
+        
+        Ticker is converted to a categorical so that deduplication, sorting,
+        groupby and pivoting operate on integer codes instead of strings.
         
         Returns:
             pd.DataFrame: Raw dataset
         """
-        if not self.raw_data_path.exists():
+        dataset_path = self.raw_data_path.with_suffix('')
+        parquet_path = self.raw_data_path.with_suffix('.parquet')
+        csv_path = self.raw_data_path.with_suffix('.csv')
+        
+        if self.raw_data is not None:
+            logger.info("Using raw data handed over in memory")
+            df, self.raw_data = self.raw_data, None
+        elif dataset_path.is_dir():
+            logger.info(f"Loading raw data from {dataset_path}/")
+            df = pd.read_parquet(dataset_path, engine='pyarrow')
+            # The partition column is appended last; restore the raw layout
+            columns = [col for col in df.columns if col != 'Ticker']
+            df = df[columns[:1] + ['Ticker'] + columns[1:]]
+        elif parquet_path.exists():
+            logger.info(f"Loading raw data from {parquet_path}")
+            df = pd.read_parquet(parquet_path, engine='pyarrow')
+        elif csv_path.exists():
+            logger.info(f"Loading raw data from {csv_path}")
+            df = self._read_raw_csv(csv_path)
+        else:
             raise FileNotFoundError(
                 f"Raw data file not found: {self.raw_data_path}\n"
                 "Please run download_data.py first."
             )
         
-        logger.info(f"Loading raw data from {self.raw_data_path}")
-        df = pd.read_csv(self.raw_data_path, parse_dates=['Date'])
+        df['Ticker'] = df['Ticker'].astype('category')
         
         self.quality_metrics['initial_rows'] = len(df)
-        logger.info(f"Loaded {len(df):,} rows, {df['Ticker'].nunique()} unique tickers")
+        # nunique hashes the whole Ticker column; only pay for it if the line is emitted
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Loaded %s rows, %d unique tickers", f"{len(df):,}", df['Ticker'].nunique())
+        
+        return df
+    
+    def _read_raw_csv(self, path):
+        """
+        Read a legacy raw CSV with the multi-threaded Arrow CSV reader.
+        
+        Columns come back typed (categorical Ticker, float32 prices), so no
+        object column or separate date-parsing pass is needed.
+        
+        Args:
+            path (Path): Raw CSV file
+            
+        Returns:
+            pd.DataFrame: Raw dataset
+        """
+        table = pacsv.read_csv(
+            path,
+            convert_options=pacsv.ConvertOptions(column_types=RAW_CSV_COLUMN_TYPES)
+        )
+        # self_destruct frees Arrow buffers as columns are converted
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+        
+        # Arrow parses offset-aware timestamps as UTC; restore exchange time
+        if df['Date'].dt.tz is not None:
+            df['Date'] = df['Date'].dt.tz_convert(MARKET_TZ)
+        
+        return df
+    
+    def downcast_dtypes(self, df):
+        """
+        Downcast OHLCV columns to narrower dtypes to cut memory and bandwidth.
+        
+        Prices are capped at float32 (float16 loses meaningful decimals) and
+        Volume is downcast to the smallest integer type that holds its range.
+        
+        Args:
+            df (pd.DataFrame): Input dataframe
+            
+        Returns:
+            pd.DataFrame: Dataframe with downcast numeric columns
+        """
+        float32_max = np.finfo(np.float32).max
+        
+        for col in ['Open', 'High', 'Low', 'Close']:
+            if col in df.columns and df[col].abs().max() < float32_max:
+                df[col] = df[col].astype(np.float32)
+        
+        if 'Volume' in df.columns:
+            df['Volume'] = pd.to_numeric(df['Volume'], downcast='integer')
+        
+        logger.info("Downcast OHLC to float32 and Volume to narrowest integer dtype")
         
         return df
     
@@ -102,13 +336,17 @@ class NIFTY500DataCleaner:
         initial_count = len(df)
         
         # Remove duplicates, keeping the last occurrence (most recent data)
-        df = df.drop_duplicates(subset=['Date', 'Ticker'], keep='last')
+        keys = self._date_ticker_keys(df)
+        if keys is not None:
+            df = df[~pd.Index(keys).duplicated(keep='last')]
+        else:
+            df.drop_duplicates(subset=['Date', 'Ticker'], keep='last', inplace=True)
         
         duplicates_removed = initial_count - len(df)
-        self.quality_metrics['duplicates_removed'] = duplicates_removed
+        self.quality_metrics['duplicates_removed'] += duplicates_removed
         
         if duplicates_removed > 0:
-            logger.info(f"Removed {duplicates_removed:,} duplicate records")
+            logger.info("Removed %d duplicate records", duplicates_removed)
         else:
             logger.info("No duplicates found")
         
@@ -125,13 +363,15 @@ class NIFTY500DataCleaner:
             pd.DataFrame: Sorted dataframe
         """
         logger.info("Sorting data by Ticker and Date")
-        df = df.sort_values(['Ticker', 'Date']).reset_index(drop=True)
+        df.sort_values(['Ticker', 'Date'], inplace=True, ignore_index=True)
         return df
     
     def handle_missing_values(self, df):
         """
         Handle missing values intelligently.
         
+        Expects the frame to be sorted by Ticker and Date (see sort_data).
+        
         Strategy:
         - OHLC: Forward fill within ticker (assumption: market didn't trade)
         - Volume: Fill with 0 (no trading volume)
@@ -145,18 +385,17 @@ class NIFTY500DataCleaner:
         """
         logger.info("Handling missing values")
         
-        initial_nulls = df.isnull().sum().sum()
-        
-        # Sort by ticker and date first
-        df = df.sort_values(['Ticker', 'Date'])
+        initial_nulls = self._count_numeric_nulls(df)
         
-        # Group by ticker for proper forward filling
-        price_columns = ['Open', 'High', 'Low', 'Close']
+        # Forward fill all price columns within each ticker in a single pass
+        price_columns = [col for col in PRICE_COLUMNS if col in df.columns]
         
-        for col in price_columns:
-            if col in df.columns:
-                # Forward fill within each ticker group
-                df[col] = df.groupby('Ticker')[col].ffill()
+        if price_columns and self.use_numba:
+            prices = df[price_columns].to_numpy(copy=True)
+            _ffill_kernel(prices, self._ticker_group_bounds(df))
+            df[price_columns] = prices
+        elif price_columns:
+            df[price_columns] = df.groupby('Ticker', sort=False, observed=True)[price_columns].ffill()
         
         # Fill remaining Volume nulls with 0
         if 'Volume' in df.columns:
@@ -164,13 +403,13 @@ class NIFTY500DataCleaner:
         
         # Drop rows where Close price is still null (beginning of series)
         if 'Close' in df.columns:
-            df = df.dropna(subset=['Close'])
+            df.dropna(subset=['Close'], inplace=True)
         
-        final_nulls = df.isnull().sum().sum()
+        final_nulls = self._count_numeric_nulls(df)
         filled = initial_nulls - final_nulls
         
-        self.quality_metrics['missing_values_filled'] = filled
-        logger.info(f"Handled {filled} missing values")
+        self.quality_metrics['missing_values_filled'] += filled
+        logger.info("Handled %d missing values", filled)
         
         return df
     
@@ -186,100 +425,342 @@ class NIFTY500DataCleaner:
         """
         logger.info("Validating data quality")
         
+        if self.use_numba and all(col in df.columns for col in PRICE_COLUMNS + ['Volume']):
+            df, issues = self._validate_with_numba(df)
+        else:
+            df, issues = self._validate_with_numpy(df)
+        
+        if issues:
+            logger.warning("Data quality issues found:")
+            for issue in issues:
+                logger.warning("  - %s", issue)
+        else:
+            logger.info("No data quality issues detected")
+        
+        return df
+    
+    def _validate_with_numpy(self, df):
+        """
+        Run validation checks as vectorized NumPy operations.
+        
+        Args:
+            df (pd.DataFrame): Input dataframe
+            
+        Returns:
+            tuple: (validated dataframe, list of issue descriptions)
+        """
         issues = []
         
-        # Check for negative prices
-        price_cols = ['Open', 'High', 'Low', 'Close']
-        for col in price_cols:
-            if col in df.columns:
-                negative_count = (df[col] < 0).sum()
-                if negative_count > 0:
-                    issues.append(f"{col}: {negative_count} negative values")
-                    # Remove negative prices
-                    df = df[df[col] >= 0]
+        # Pull the price block once and derive every validity mask from it
+        price_cols = [col for col in PRICE_COLUMNS if col in df.columns]
+        prices = df[price_cols].to_numpy()
+        
+        # Check for negative prices (rows are removed after all checks)
+        negative = prices < 0
+        keep = ~negative.any(axis=1)
+        for col, negative_count in zip(price_cols, negative.sum(axis=0)):
+            if negative_count > 0:
+                issues.append(f"{col}: {negative_count} negative values")
+        
+        corrected = {}
         
         # Check for negative volumes
         if 'Volume' in df.columns:
-            negative_vol = (df['Volume'] < 0).sum()
+            volume = df['Volume'].to_numpy()
+            negative_vol_mask = volume < 0
+            negative_vol = (keep & negative_vol_mask).sum()
             if negative_vol > 0:
                 issues.append(f"Volume: {negative_vol} negative values")
-                df.loc[df['Volume'] < 0, 'Volume'] = 0
+                corrected['Volume'] = np.where(negative_vol_mask, 0, volume)
         
         # Check for High < Low (impossible)
-        if 'High' in df.columns and 'Low' in df.columns:
-            invalid_hl = (df['High'] < df['Low']).sum()
+        if 'High' in price_cols and 'Low' in price_cols:
+            high = prices[:, price_cols.index('High')]
+            low = prices[:, price_cols.index('Low')]
+            swap = high < low
+            invalid_hl = (keep & swap).sum()
             if invalid_hl > 0:
                 issues.append(f"{invalid_hl} rows where High < Low")
                 # Swap High and Low
-                mask = df['High'] < df['Low']
-                df.loc[mask, ['High', 'Low']] = df.loc[mask, ['Low', 'High']].values
+                high, low = np.where(swap, low, high), np.where(swap, high, low)
+                corrected['High'] = high
+                corrected['Low'] = low
+            
+            # Check for Close outside High-Low range
+            if 'Close' in price_cols:
+                close = prices[:, price_cols.index('Close')]
+                outside_range = (keep & ((close > high) | (close < low))).sum()
+                if outside_range > 0:
+                    issues.append(f"{outside_range} rows where Close outside High-Low range")
+        
+        # Write corrections back and drop rows with negative prices
+        for col, values in corrected.items():
+            df[col] = values
+        if not keep.all():
+            df = df[keep]
+        
+        return df, issues
+    
+    def _validate_with_numba(self, df):
+        """
+        Run validation checks and corrections in a single parallel Numba pass.
         
-        # Check for Close outside High-Low range
-        if all(col in df.columns for col in ['Close', 'High', 'Low']):
-            outside_range = ((df['Close'] > df['High']) | (df['Close'] < df['Low'])).sum()
-            if outside_range > 0:
-                issues.append(f"{outside_range} rows where Close outside High-Low range")
+        Args:
+            df (pd.DataFrame): Input dataframe with all OHLCV columns
+            
+        Returns:
+            tuple: (validated dataframe, list of issue descriptions)
+        """
+        prices = df[PRICE_COLUMNS].to_numpy(copy=True)
+        volume = df['Volume'].to_numpy(copy=True)
+        keep = np.empty(len(df), dtype=np.bool_)
         
-        if issues:
-            logger.warning("Data quality issues found:")
-            for issue in issues:
-                logger.warning(f"  - {issue}")
-        else:
-            logger.info("No data quality issues detected")
+        counts = _validate_kernel(prices, volume, keep)
         
-        return df
+        issues = []
+        for col, negative_count in zip(PRICE_COLUMNS, counts[:4]):
+            if negative_count > 0:
+                issues.append(f"{col}: {negative_count} negative values")
+        negative_vol, invalid_hl, outside_range = counts[4:]
+        if negative_vol > 0:
+            issues.append(f"Volume: {negative_vol} negative values")
+        if invalid_hl > 0:
+            issues.append(f"{invalid_hl} rows where High < Low")
+        if outside_range > 0:
+            issues.append(f"{outside_range} rows where Close outside High-Low range")
+        
+        df[PRICE_COLUMNS] = prices
+        df['Volume'] = volume
+        if not keep.all():
+            df = df[keep]
+        
+        return df, issues
     
-    def add_metadata_columns(self, df):
+    def _count_numeric_nulls(self, df):
+        """
+        Count NaNs in the OHLCV block without building a full-frame null mask.
+        
+        Date and Ticker are never null after loading, and integer columns
+        cannot hold NaN, so only float columns are scanned.
+        
+        Args:
+            df (pd.DataFrame): Input dataframe
+            
+        Returns:
+            int: Number of missing OHLCV values
+        """
+        float_columns = [col for col in PRICE_COLUMNS + ['Volume']
+                         if col in df.columns and df[col].dtype.kind == 'f']
+        
+        if not float_columns:
+            return 0
+        
+        block = df[float_columns].to_numpy(dtype=np.float32, copy=False, na_value=np.nan)
+        return int(np.isnan(block).sum())
+    
+    def factorize_dates(self, df):
+        """
+        Map each row's Date to an integer code into the sorted unique dates.
+        
+        Computing this once for the final frame and passing it to
+        add_metadata_columns, calculate_statistics and save_processed_data
+        lets them share a single factorization.
+        
+        Args:
+            df (pd.DataFrame): Input dataframe
+            
+        Returns:
+            tuple: (codes per row, sorted unique dates as a DatetimeIndex)
+        """
+        return pd.factorize(df['Date'], sort=True)
+    
+    def _date_ticker_keys(self, df):
+        """
+        Pack each row's (Date, Ticker) pair into a single int64 key.
+        
+        Date codes fill the high bits and categorical Ticker codes the low
+        16 bits, so duplicate detection hashes one integer per row instead of
+        a (timestamp, string) tuple. Raw nanosecond timestamps would overflow
+        when shifted, hence the factorized dates.
+        
+        Args:
+            df (pd.DataFrame): Input dataframe
+            
+        Returns:
+            np.ndarray or None: Keys per row, or None when Ticker is not
+                categorical, has 2**16 or more categories, or contains nulls
+        """
+        if not isinstance(df['Ticker'].dtype, pd.CategoricalDtype):
+            return None
+        if len(df['Ticker'].cat.categories) >= 2 ** 16:
+            return None
+        
+        ticker_codes = df['Ticker'].cat.codes.to_numpy().astype(np.int64)
+        date_codes, _ = pd.factorize(df['Date'])
+        if (ticker_codes < 0).any() or (date_codes < 0).any():
+            return None
+        
+        return (date_codes.astype(np.int64) << 16) | ticker_codes
+    
+    def _ticker_group_bounds(self, df):
+        """
+        Row boundaries of each ticker in a frame sorted by Ticker.
+        
+        Args:
+            df (pd.DataFrame): Dataframe sorted by Ticker
+            
+        Returns:
+            np.ndarray: Start row of each ticker followed by the row count
+        """
+        codes = pd.Categorical(df['Ticker']).codes
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        return np.append(starts, len(codes))
+    
+    def add_metadata_columns(self, df, date_factorization=None):
         """
         Add useful metadata columns for trading strategies.
         
         Args:
             df (pd.DataFrame): Input dataframe
+            date_factorization (tuple): factorize_dates(df), computed here if
+                not given
             
         Returns:
             pd.DataFrame: Enhanced dataframe
         """
         logger.info("Adding metadata columns")
         
+        # Calendar fields are computed on the unique dates and broadcast back
+        date_codes, dates = date_factorization or self.factorize_dates(df)
+        
         # Add trading day of week (for seasonality analysis)
-        df['DayOfWeek'] = df['Date'].dt.dayofweek
+        df['DayOfWeek'] = dates.dayofweek.to_numpy().astype(np.int8)[date_codes]
         
         # Add year and month for grouping
-        df['Year'] = df['Date'].dt.year
-        df['Month'] = df['Date'].dt.month
+        df['Year'] = dates.year.to_numpy().astype(np.int16)[date_codes]
+        df['Month'] = dates.month.to_numpy().astype(np.int8)[date_codes]
         
-        # Add placeholder for transaction costs (to be configured per strategy)
-        # Typical values: 0.0003 (0.03%) for institutional, 0.001 (0.1%) for retail
-        df['TransactionCostBps'] = 3.0  # 3 basis points = 0.03%
+        logger.info("Added metadata columns: DayOfWeek, Year, Month")
         
-        logger.info("Added metadata columns: DayOfWeek, Year, Month, TransactionCostBps")
+        return df
+    
+    def clean_ticker_frame(self, df):
+        """
+        Clean a single ticker's raw frame (streaming mode).
+        
+        Runs the same steps as the batch pipeline. With one ticker per frame,
+        deduplication and forward filling never need to look across tickers.
+        Quality metrics accumulate across calls.
+        
+        Args:
+            df (pd.DataFrame): Raw data for one ticker
+            
+        Returns:
+            pd.DataFrame: Cleaned dataframe
+        """
+        self.quality_metrics['initial_rows'] += len(df)
+        df['Ticker'] = df['Ticker'].astype('category')
+        
+        df = self.downcast_dtypes(df)
+        df = self.remove_duplicates(df)
+        df = self.sort_data(df)
+        df = self.handle_missing_values(df)
+        df = self.validate_data(df)
+        df = self.add_metadata_columns(df)
         
         return df
     
-    def calculate_statistics(self, df):
+    def clean_stream(self, frame_queue):
+        """
+        Clean per-ticker frames from a queue while they are being downloaded.
+        
+        Frames are consumed until a None sentinel, cleaned with
+        clean_ticker_frame and appended to the master dataset as they arrive.
+        Statistics and wide outputs are then built from the Date, Ticker,
+        Close and Volume columns of the master Parquet file, which is always
+        written in this mode (plus a CSV copy if the output format asks for it).
+        
+        Args:
+            frame_queue (queue.Queue): Raw per-ticker frames, ended by None
+            
+        Returns:
+            dict: Lists of paths to saved files, keyed by dataset
+        """
+        logger.info("Cleaning downloaded frames as they arrive")
+        
+        master_path = self.processed_dir / 'nifty500_master.parquet'
+        csv_path = self.processed_dir / 'nifty500_master.csv'
+        write_csv = self.output_format in ('csv', 'both')
+        writer = None
+        frames_written = 0
+        
+        try:
+            while (raw := frame_queue.get()) is not None:
+                df = self.clean_ticker_frame(raw)
+                
+                if writer is None:
+                    # Volume is downcast per frame; store one fixed type
+                    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+                    schema = schema.set(schema.get_field_index('Volume'),
+                                        pa.field('Volume', pa.int64()))
+                    writer = pq.ParquetWriter(master_path, schema, compression='zstd')
+                
+                writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+                if write_csv:
+                    first = frames_written == 0
+                    df.to_csv(csv_path, mode='w' if first else 'a', header=first, index=False)
+                frames_written += 1
+        except Exception:
+            # Keep draining so the producer never blocks on a full queue
+            while frame_queue.get() is not None:
+                pass
+            raise
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        if frames_written == 0:
+            raise ValueError("No downloaded data received for cleaning")
+        
+        master_paths = [master_path, csv_path] if write_csv else [master_path]
+        logger.info("Saved master dataset to %s", ', '.join(map(str, master_paths)))
+        
+        df = pd.read_parquet(master_path, columns=['Date', 'Ticker', 'Close', 'Volume'])
+        date_factorization = self.factorize_dates(df)
+        self.calculate_statistics(df, date_factorization)
+        
+        saved_files = {'master': master_paths}
+        saved_files.update(self._save_frames_parallel(self._build_wide_frames(df, date_factorization)))
+        
+        return saved_files
+    
+    def calculate_statistics(self, df, date_factorization=None):
         """
         Calculate dataset statistics.
         
         Args:
             df (pd.DataFrame): Cleaned dataframe
+            date_factorization (tuple): factorize_dates(df), computed here if
+                not given
         """
         self.quality_metrics['final_rows'] = len(df)
         self.quality_metrics['tickers_processed'] = df['Ticker'].nunique()
         
-        # Date range statistics
+        # Date range statistics (from the sorted unique dates)
+        _, dates = date_factorization or self.factorize_dates(df)
         self.quality_metrics['date_range'] = {
-            'earliest': df['Date'].min().strftime('%Y-%m-%d'),
-            'latest': df['Date'].max().strftime('%Y-%m-%d'),
-            'total_days': (df['Date'].max() - df['Date'].min()).days,
-            'trading_days': df['Date'].nunique()
+            'earliest': dates[0].strftime('%Y-%m-%d'),
+            'latest': dates[-1].strftime('%Y-%m-%d'),
+            'total_days': (dates[-1] - dates[0]).days,
+            'trading_days': len(dates)
         }
         
-        # Calculate average years of data per ticker
-        ticker_stats = df.groupby('Ticker').agg({
-            'Date': ['min', 'max', 'count']
-        })
-        ticker_stats.columns = ['min_date', 'max_date', 'records']
-        ticker_stats['years'] = (ticker_stats['max_date'] - ticker_stats['min_date']).dt.days / 365.25
+        # Calculate average years of data per ticker in a single groupby
+        ticker_stats = df.groupby('Ticker', observed=True, sort=False)['Date'].agg(
+            min_date='min', max_date='max', records='count'
+        )
+        span = ticker_stats['max_date'].values - ticker_stats['min_date'].values
+        ticker_stats['years'] = span.astype('timedelta64[D]').astype(np.int32) / 365.25
         
         avg_years = ticker_stats['years'].mean()
         
@@ -291,43 +772,159 @@ class NIFTY500DataCleaner:
         self.quality_metrics['data_quality_score'] = round(quality_score, 2)
         self.quality_metrics['average_years_of_data'] = round(avg_years, 2)
         
-    def save_processed_data(self, df):
+    def save_processed_data(self, df, date_factorization=None):
         """
-        Save processed data in multiple formats.
+        Save processed data in the configured output format(s).
         
         Args:
             df (pd.DataFrame): Cleaned dataframe
+            date_factorization (tuple): factorize_dates(df), computed here if
+                not given
             
         Returns:
-            dict: Paths to saved files
+            dict: Lists of paths to saved files, keyed by dataset
         """
         logger.info("Saving processed data")
         
-        saved_files = {}
+        # 1. Complete dataset (long format), plus 2./3. wide-format frames
+        frames = {'master': (df, 'nifty500_master', False)}
+        frames.update(self._build_wide_frames(df, date_factorization))
         
-        # 1. Save complete dataset (Multi-index format: Date x Ticker)
-        master_path = self.processed_dir / 'nifty500_master.csv'
-        df.to_csv(master_path, index=False)
-        saved_files['master'] = master_path
-        logger.info(f"Saved master dataset to {master_path}")
+        return self._save_frames_parallel(frames)
+    
+    def _build_wide_frames(self, df, date_factorization=None):
+        """
+        Build wide-format (Date x Ticker) close prices and volumes.
         
-        # 2. Save close prices only (wide format for quick analysis)
-        close_pivot = df.pivot(index='Date', columns='Ticker', values='Close')
-        close_path = self.processed_dir / 'nifty500_close_prices.csv'
-        close_pivot.to_csv(close_path)
-        saved_files['close_prices'] = close_path
-        logger.info(f"Saved close prices to {close_path}")
+        Args:
+            df (pd.DataFrame): Cleaned dataframe with Date, Ticker, Close and
+                optionally Volume columns
+            date_factorization (tuple): factorize_dates(df), computed here if
+                not given
+            
+        Returns:
+            dict: (frame, file name, write index) tuples, keyed by dataset
+        """
+        frames = {}
         
-        # 3. Save volume data (for liquidity analysis)
+        # Date x Ticker positions are computed once and shared by both wide frames
+        date_codes, dates = date_factorization or self.factorize_dates(df)
+        tickers = pd.Categorical(df['Ticker']).remove_unused_categories()
+        ticker_codes = tickers.codes
+        wide_index = pd.Index(dates, name='Date')
+        wide_columns = pd.Index(tickers.categories, name='Ticker')
+        
+        # 2. Close prices only (wide format for quick analysis)
+        close_pivot = self._pivot_wide(df['Close'].to_numpy(), date_codes, ticker_codes,
+                                       wide_index, wide_columns)
+        frames['close_prices'] = (close_pivot, 'nifty500_close_prices', True)
+        
+        # 3. Volume data (for liquidity analysis)
         if 'Volume' in df.columns:
-            volume_pivot = df.pivot(index='Date', columns='Ticker', values='Volume')
-            volume_path = self.processed_dir / 'nifty500_volumes.csv'
-            volume_pivot.to_csv(volume_path)
-            saved_files['volumes'] = volume_path
-            logger.info(f"Saved volumes to {volume_path}")
+            volume_pivot = self._pivot_wide(df['Volume'].to_numpy(), date_codes, ticker_codes,
+                                            wide_index, wide_columns)
+            frames['volumes'] = (volume_pivot, 'nifty500_volumes', True)
+        
+        return frames
+    
+    def _save_frames_parallel(self, frames):
+        """
+        Write independent frames concurrently, one thread per frame.
+        
+        The pyarrow and pandas C writers release the GIL, so serializing one
+        frame overlaps with disk I/O for the others.
+        
+        Args:
+            frames (dict): (frame, file name, write index) tuples, keyed by dataset
+            
+        Returns:
+            dict: Lists of paths to saved files, keyed by dataset
+        """
+        with ThreadPoolExecutor(max_workers=len(frames)) as executor:
+            futures = {
+                key: executor.submit(self._save_frame, frame, name, index)
+                for key, (frame, name, index) in frames.items()
+            }
+            saved_files = {key: future.result() for key, future in futures.items()}
+        
+        for key, paths in saved_files.items():
+            logger.info("Saved %s to %s", key.replace('_', ' '), ', '.join(map(str, paths)))
         
         return saved_files
     
+    def _save_frame(self, df, name, index):
+        """
+        Write a frame to the processed directory in the configured format(s).
+        
+        Parquet (pyarrow, zstd) avoids the float-to-text formatting cost of
+        CSV and preserves column dtypes for readers. Both formats are written
+        in chunks of WRITE_CHUNK_ROWS rows so the full serialized output is
+        never held in memory at once.
+        
+        Args:
+            df (pd.DataFrame): Frame to write
+            name (str): File name without extension
+            index (bool): Whether to write the frame index
+            
+        Returns:
+            list: Paths to written files
+        """
+        paths = []
+        
+        if self.output_format in ('parquet', 'both'):
+            parquet_path = self.processed_dir / f'{name}.parquet'
+            self._write_parquet_chunked(df, parquet_path, index)
+            paths.append(parquet_path)
+        
+        if self.output_format in ('csv', 'both'):
+            csv_path = self.processed_dir / f'{name}.csv'
+            df.to_csv(csv_path, index=index, chunksize=WRITE_CHUNK_ROWS)
+            paths.append(csv_path)
+        
+        return paths
+    
+    def _write_parquet_chunked(self, df, path, index):
+        """
+        Write a frame to Parquet one row group at a time.
+        
+        Args:
+            df (pd.DataFrame): Frame to write
+            path (Path): Output file
+            index (bool): Whether to write the frame index
+        """
+        schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=index)
+        writer = pq.ParquetWriter(path, schema, compression='zstd')
+        
+        try:
+            for start in range(0, len(df), WRITE_CHUNK_ROWS):
+                chunk = df.iloc[start:start + WRITE_CHUNK_ROWS]
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=index))
+        finally:
+            writer.close()
+    
+    def _pivot_wide(self, values, date_codes, ticker_codes, index, columns):
+        """
+        Scatter long-format values into a dense Date x Ticker frame.
+        
+        Equivalent to df.pivot for unique (Date, Ticker) pairs, but uses
+        precomputed integer codes instead of rebuilding hash indexes.
+        
+        Args:
+            values (np.ndarray): Values to place, one per row
+            date_codes (np.ndarray): Row position of each value
+            ticker_codes (np.ndarray): Column position of each value
+            index (pd.Index): Sorted unique dates
+            columns (pd.Index): Ticker labels
+            
+        Returns:
+            pd.DataFrame: Wide frame with NaN where a ticker has no data
+        """
+        # Smallest float dtype that holds the values exactly (int32 -> float64)
+        dtype = np.result_type(values.dtype, np.float32)
+        wide = np.full((len(index), len(columns)), np.nan, dtype=dtype)
+        wide[date_codes, ticker_codes] = values
+        return pd.DataFrame(wide, index=index, columns=columns)
+    
     def convert_to_native_types(self, obj):
         """
         Convert numpy/pandas types to native Python types for JSON serialization.
@@ -338,18 +935,22 @@ class NIFTY500DataCleaner:
         Returns:
             Object with all numpy/pandas types converted to native Python types
         """
-        if isinstance(obj, dict):
+        # Native scalars are by far the most common values; return them untouched
+        if isinstance(obj, NATIVE_JSON_TYPES):
+            return obj
+        elif isinstance(obj, dict):
             return {key: self.convert_to_native_types(value) for key, value in obj.items()}
         elif isinstance(obj, list):
             return [self.convert_to_native_types(item) for item in obj]
-        elif isinstance(obj, (np.integer, np.int64, np.int32)):
+        elif isinstance(obj, (float, np.floating)):
+            # Only floats can be NaN; JSON has no NaN, so emit null
+            return None if pd.isna(obj) else float(obj)
+        elif isinstance(obj, np.integer):
             return int(obj)
-        elif isinstance(obj, (np.floating, np.float64, np.float32)):
-            return float(obj)
+        elif isinstance(obj, np.bool_):
+            return bool(obj)
         elif isinstance(obj, np.ndarray):
             return obj.tolist()
-        elif pd.isna(obj):
-            return None
         else:
             return obj
     
@@ -361,6 +962,7 @@ class NIFTY500DataCleaner:
         
         report = {
             'report_date': datetime.now().isoformat(),
+            'transaction_cost_bps': TRANSACTION_COST_BPS,
             'metrics': self.quality_metrics
         }
         
@@ -402,19 +1004,23 @@ def main():
     try:
         # Load raw data
         df = cleaner.load_raw_data()
+        df = cleaner.downcast_dtypes(df)
         
         # Clean data
         df = cleaner.remove_duplicates(df)
         df = cleaner.sort_data(df)
         df = cleaner.handle_missing_values(df)
         df = cleaner.validate_data(df)
-        df = cleaner.add_metadata_columns(df)
+        
+        # One Date factorization shared by the remaining steps
+        date_factorization = cleaner.factorize_dates(df)
+        df = cleaner.add_metadata_columns(df, date_factorization)
         
         # Calculate statistics
-        cleaner.calculate_statistics(df)
+        cleaner.calculate_statistics(df, date_factorization)
         
         # Save processed data
-        saved_files = cleaner.save_processed_data(df)
+        saved_files = cleaner.save_processed_data(df, date_factorization)
         
         # Save quality report
         cleaner.save_quality_report()
@@ -4,38 +4,244 @@ NIFTY 500 Historical Data Downloader
 Downloads historical OHLCV data for all NIFTY 500 stocks using yfinance.
 
 Features:
-- Bulk download with progress tracking
-- Retry logic for failed downloads
+- Batched download (yf.download) with progress tracking
+- Retry logic for failed batches
 - Automatic error logging
 - Multi-threading support
+- Optional asyncio/httpx engine for concurrent downloads
+- Optional process pool engine (one session per worker process)
 - Data validation
 
 Author: Quantitative Infrastructure Team
 """
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
 import yfinance as yf
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
+from logging.handlers import MemoryHandler
+import atexit
 from pathlib import Path
 from tqdm import tqdm
 import json
+import csv
 from datetime import datetime, timedelta
 import time
+import shutil
+import asyncio
+import multiprocessing
+import numpy as np
 import warnings
 
+try:
+    # Browser-impersonating HTTP client that yfinance (0.2.54+) requires
+    from curl_cffi import requests as curl_requests
+    CURL_CFFI_AVAILABLE = True
+except ImportError:
+    CURL_CFFI_AVAILABLE = False
+
+try:
+    import httpx
+    from aiolimiter import AsyncLimiter
+    ASYNC_AVAILABLE = True
+except ImportError:
+    ASYNC_AVAILABLE = False
+
+from utils import ensure_dirs, TokenBucket
+
 warnings.filterwarnings('ignore')
 
-# Configure logging
+# Configure logging (file records are buffered and written in batches,
+# flushed on ERROR and at exit)
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+ensure_dirs(('logs',))
+file_handler = logging.FileHandler('logs/download.log')
+file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+buffered_file_handler = MemoryHandler(capacity=512, flushLevel=logging.ERROR,
+                                      target=file_handler)
+atexit.register(buffered_file_handler.flush)
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler('logs/download.log'),
+        buffered_file_handler,
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Raw data dataset (directory under raw_data_dir, partitioned by Ticker)
+RAW_DATASET_NAME = 'nifty500_raw_data'
+
+# Tickers requested per yf.download call
+DOWNLOAD_CHUNK_SIZE = 50
+
+# yf.download calls per second (halved automatically while Yahoo throttles)
+DOWNLOAD_RATE_LIMIT = 2
+
+# Keep-alive connections per host in the shared HTTP session; at least as
+# many as the threads yf.download runs for one DOWNLOAD_CHUNK_SIZE batch, so
+# connections are reused instead of discarded when the pool is full
+HTTP_POOL_SIZE = 64
+
+# Transport-level retries (connection errors, throttling and 5xx responses)
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Download engines: batched yf.download, concurrent chart requests (httpx),
+# or batched yf.download spread over worker processes
+DOWNLOAD_ENGINES = ('yfinance', 'async', 'pool')
+
+# Pool engine: worker processes (they share DOWNLOAD_RATE_LIMIT between them)
+POOL_PROCESSES = 8
+
+# Async engine: Yahoo chart endpoint, open requests and requests per second
+YAHOO_CHART_URL = 'https://query1.finance.yahoo.com/v8/finance/chart/{ticker}'
+HTTP_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+ASYNC_CONCURRENCY = 10
+ASYNC_RATE_LIMIT = 20
+
+# Cached histories are extended from their last bar once they are older than this
+CACHE_TAIL_TTL = timedelta(days=1)
+
+
+def _tree_concat(frames, chunk=32):
+    """
+    Concatenate many frames hierarchically, chunk frames at a time.
+    
+    Each level combines groups of chunk frames and releases them before the
+    next level, so the per-ticker frames are freed as the combined frame is
+    built instead of all staying alive until one large concat finishes.
+    
+    Args:
+        frames (list): DataFrames to combine (the list is emptied)
+        chunk (int): Frames combined per concat call
+        
+    Returns:
+        pd.DataFrame: Combined frame with a fresh RangeIndex
+    """
+    while len(frames) > 1:
+        level = []
+        for i in range(0, len(frames), chunk):
+            group = frames[i:i + chunk]
+            level.append(pd.concat(group, ignore_index=True))
+            # Drop the list's references so merged frames can be freed
+            frames[i:i + chunk] = [None] * len(group)
+            del group
+        frames[:] = level
+    
+    return frames.pop().reset_index(drop=True) if frames else pd.DataFrame()
+
+
+class CacheStore:
+    """
+    On-disk cache of per-ticker price history.
+    
+    Each ticker is stored as data/cache/{ticker}.parquet with a sidecar
+    {ticker}.meta.json recording the requested start date, whether the
+    Dividends/Stock Splits columns were kept and the last bar, so later runs
+    only download the bars after it.
+    """
+    
+    def __init__(self, cache_dir='data/cache'):
+        """
+        Initialize the cache.
+        
+        Args:
+            cache_dir (str): Directory holding cached histories
+        """
+        self.cache_dir = Path(cache_dir)
+        ensure_dirs((str(self.cache_dir),))
+    
+    def _paths(self, ticker):
+        return (self.cache_dir / f"{ticker}.parquet",
+                self.cache_dir / f"{ticker}.meta.json")
+    
+    def load(self, ticker, start_date, include_actions=False):
+        """
+        Load a cached history downloaded from the same start date.
+        
+        Args:
+            ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            start_date (str): Requested start date (YYYY-MM-DD)
+            include_actions (bool): Whether Dividends/Stock Splits are required
+            
+        Returns:
+            tuple or None: (history, metadata) or None on a cache miss
+        """
+        data_path, meta_path = self._paths(ticker)
+        
+        if not (data_path.exists() and meta_path.exists()):
+            return None
+        
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            
+            # Entries written before the flag existed always kept the actions
+            if (meta.get('start_date') != start_date
+                    or meta.get('include_actions', True) != include_actions):
+                return None
+            
+            return pd.read_parquet(data_path, engine='pyarrow'), meta
+        
+        except Exception as e:
+            logger.warning(f"{ticker}: Ignoring unreadable cache entry - {e}")
+            return None
+    
+    def save(self, ticker, df, start_date, include_actions=False, end_date=None):
+        """
+        Store a ticker's full history.
+        
+        Args:
+            ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            df (pd.DataFrame): History with a Date column
+            start_date (str): Requested start date (YYYY-MM-DD)
+            include_actions (bool): Whether df has Dividends/Stock Splits
+            end_date (str): Requested end date (YYYY-MM-DD) the history was
+                downloaded up to
+        """
+        data_path, meta_path = self._paths(ticker)
+        
+        df.to_parquet(data_path, engine='pyarrow', compression='zstd', index=False)
+        
+        meta = {
+            'start_date': start_date,
+            'include_actions': include_actions,
+            'end_date': end_date,
+            'last_date': df['Date'].iloc[-1].strftime('%Y-%m-%d'),
+            'saved_at': datetime.now().isoformat()
+        }
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+    
+    def is_fresh(self, meta, end_date):
+        """
+        Whether a cached history was extended recently enough to reuse as is.
+        
+        Only histories downloaded up to at least end_date qualify, so a run
+        with a later end date than the cached one still extends it.
+        
+        Args:
+            meta (dict): Cache entry metadata
+            end_date (str): Requested end date (YYYY-MM-DD)
+            
+        Returns:
+            bool: True if saved within CACHE_TAIL_TTL and covering end_date
+        """
+        # Entries written before end_date was recorded are never fresh
+        if not meta.get('end_date'):
+            return False
+        
+        covers_end = pd.Timestamp(meta['end_date']) >= pd.Timestamp(end_date)
+        return covers_end and datetime.now() - datetime.fromisoformat(meta['saved_at']) < CACHE_TAIL_TTL
+
 
 class NIFTY500Downloader:
     """
@@ -46,7 +252,10 @@ class NIFTY500Downloader:
     """
     
     def __init__(self, start_date='2000-01-01', end_date=None, 
-                 raw_data_dir='data/raw', max_retries=3):
+                 raw_data_dir='data/raw', max_retries=3,
+                 chunk_size=DOWNLOAD_CHUNK_SIZE, engine='yfinance',
+                 use_cache=True, cache_dir='data/cache', include_actions=False,
+                 update_mode=False):
         """
         Initialize the downloader.
         
@@ -55,26 +264,82 @@ class NIFTY500Downloader:
             end_date (str): End date in YYYY-MM-DD format (defaults to today)
             raw_data_dir (str): Directory to save raw data
             max_retries (int): Maximum retry attempts for failed downloads
+            chunk_size (int): Tickers requested per yf.download call
+            engine (str): 'yfinance' (batched yf.download), 'async'
+                (concurrent chart API requests, requires httpx and aiolimiter)
+                or 'pool' (batches downloaded by POOL_PROCESSES processes)
+            use_cache (bool): Reuse per-ticker histories cached by earlier runs
+                and only download the bars after them
+            cache_dir (str): Directory for cached per-ticker histories
+            include_actions (bool): Keep Dividends and Stock Splits columns
+                (prices are adjusted for them either way)
+            update_mode (bool): Download only the bars after each ticker's
+                last stored date and add them to its partition of the existing
+                raw data dataset (requires download_all(stream_to_disk=True);
+                bypasses the cache)
         """
+        if engine not in DOWNLOAD_ENGINES:
+            raise ValueError(f"engine must be one of {DOWNLOAD_ENGINES}, got '{engine}'")
+        
+        if engine == 'async' and not ASYNC_AVAILABLE:
+            logger.warning("httpx/aiolimiter are not installed; using yf.download")
+            engine = 'yfinance'
+        
         self.start_date = start_date
-        self.end_date = end_date or datetime.now().strftime('%Y-%m-%d')
+        # Normalised to YYYY-MM-DD so the value recorded in cache metadata
+        # compares consistently across runs
+        self.end_date = pd.Timestamp(end_date or datetime.now()).strftime('%Y-%m-%d')
         self.raw_data_dir = Path(raw_data_dir)
         self.max_retries = max_retries
+        self.chunk_size = chunk_size
+        self.engine = engine
+        self.include_actions = include_actions
+        self.update_mode = update_mode
+        # Update mode appends partial histories, which must not replace cache entries
+        self.cache = CacheStore(cache_dir) if use_cache and not update_mode else None
         
-        # Create directories
-        self.raw_data_dir.mkdir(parents=True, exist_ok=True)
-        Path('logs').mkdir(exist_ok=True)
+        # One session (cookies, crumb, open connections) for every request
+        self.session = self._create_session()
+        self.rate_limiter = TokenBucket(DOWNLOAD_RATE_LIMIT)
+        
+        # Create directories (once per process)
+        ensure_dirs((str(self.raw_data_dir), 'logs'))
         
         # Statistics tracking
         self.stats = {
             'total_tickers': 0,
             'successful': 0,
             'failed': 0,
+            'records': 0,
             'failed_tickers': [],
             'download_start': datetime.now(),
             'download_end': None
         }
         
+    def _create_session(self):
+        """
+        Create the HTTP session shared by all yf.download calls.
+        
+        Reusing one session means the Yahoo cookie/crumb handshake and TLS
+        connections are set up once per run instead of once per request.
+        
+        Returns:
+            Session: curl_cffi session impersonating Chrome when available
+            (required by current yfinance; it keeps one connection cache per
+            thread), else a pooled requests session that retries transient
+            failures
+        """
+        if CURL_CFFI_AVAILABLE:
+            return curl_requests.Session(impersonate='chrome')
+        
+        session = requests.Session()
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=HTTP_RETRY_STATUSES)
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE,
+                              max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
     def load_tickers(self, ticker_file='data/raw/nifty500_tickers.csv'):
         """
         Load ticker symbols from file.
@@ -93,82 +358,491 @@ class NIFTY500Downloader:
                 "Please run fetch_tickers.py first."
             )
         
-        df = pd.read_csv(ticker_path)
-        tickers = df['ticker'].tolist()
+        # A single text column; the csv module avoids building a DataFrame
+        with open(ticker_path, 'r', newline='') as f:
+            tickers = [row['ticker'] for row in csv.DictReader(f) if row['ticker']]
         
         logger.info(f"Loaded {len(tickers)} tickers from {ticker_file}")
         return tickers
     
-    def download_ticker(self, ticker):
+    def _format_frame(self, ticker, df):
         """
-        Download historical data for a single ticker with retry logic.
+        Shape one ticker's yfinance history into the raw data layout.
         
         Args:
             ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            df (pd.DataFrame): History indexed by Date
             
         Returns:
-            pd.DataFrame or None: Historical data or None if failed
+            pd.DataFrame or None: Formatted data or None if empty
+        """
+        # Prices fit float32, halving the numeric columns; take them as one block
+        price_cols = [col for col in ['Open', 'High', 'Low', 'Close'] if col in df.columns]
+        prices = df[price_cols].to_numpy(dtype=np.float32).T
+        
+        # Rows where the ticker did not trade are all-NaN after batch alignment
+        traded = ~np.isnan(prices).all(axis=0)
+        
+        if not traded.any():
+            logger.warning(f"{ticker}: No data available")
+            return None
+        
+        # One contiguous row per price column
+        prices = prices[:, traded]
+        
+        # Build the output columns directly in their final order instead of
+        # assigning, resetting the index and reordering (each a full copy)
+        columns = {'Date': df.index[traded], 'Ticker': ticker.replace('.NS', '')}
+        for i, col in enumerate(price_cols):
+            columns[col] = prices[i]
+        
+        # Alignment NaNs turn Volume into floats; restore integers when complete
+        if 'Volume' in df.columns:
+            volume = df['Volume'].to_numpy()[traded]
+            if not pd.isna(volume).any():
+                fits_uint32 = volume.min() >= 0 and volume.max() <= np.iinfo(np.uint32).max
+                volume = volume.astype(np.uint32 if fits_uint32 else np.int64)
+            columns['Volume'] = volume
+        
+        # Add columns if they exist
+        for col in ['Dividends', 'Stock Splits']:
+            if col in df.columns:
+                columns[col] = df[col].to_numpy()[traded]
+        
+        # The arrays above are fresh (masked) copies, so they can be adopted as is
+        df = pd.DataFrame(columns, copy=False)
+        
+        logger.info(f"{ticker}: Downloaded {len(df)} records from "
+                  f"{df['Date'].min().date()} to {df['Date'].max().date()}")
+        
+        return df
+    
+    def download_batch(self, tickers, start=None):
+        """
+        Download historical data for a batch of tickers in one yf.download call.
+        
+        The retry logic wraps the whole batch; yfinance threads the
+        per-symbol requests internally.
+        
+        Args:
+            tickers (list): Ticker symbols (e.g., ['RELIANCE.NS', 'TCS.NS'])
+            start (str): First date to download (defaults to start_date)
+            
+        Returns:
+            dict: Ticker symbol -> pd.DataFrame, or None if no data
         """
         for attempt in range(self.max_retries):
+            self.rate_limiter.consume()
+            
             try:
-                # Download data from yfinance
-                stock = yf.Ticker(ticker)
-                df = stock.history(
-                    start=self.start_date,
+                raw = yf.download(
+                    tickers,
+                    start=start or self.start_date,
                     end=self.end_date,
+                    group_by='ticker',
+                    threads=True,
+                    progress=False,
                     auto_adjust=True,  # Adjust for splits and dividends
-                    actions=True       # Include dividends and splits
+                    actions=self.include_actions,
+                    ignore_tz=False,   # Keep exchange-local timestamps
+                    session=self.session
                 )
                 
-                if df.empty:
-                    logger.warning(f"{ticker}: No data available")
-                    return None
-                
-                # Add ticker column
-                df['Ticker'] = ticker.replace('.NS', '')
+                # yf.download swallows per-ticker errors; a batch with no data
+                # at all is what throttling looks like from here
+                if raw is None or raw.empty:
+                    raise ValueError("empty response")
                 
-                # Reset index to make Date a column
-                df.reset_index(inplace=True)
+                self.rate_limiter.reward()
+                break
                 
-                # Reorder columns for consistency
-                cols = ['Date', 'Ticker', 'Open', 'High', 'Low', 'Close', 'Volume']
+            except Exception as e:
+                logger.warning(f"Batch of {len(tickers)} tickers: Attempt {attempt + 1} failed - {e}")
+                self.rate_limiter.penalize()
                 
-                # Add columns if they exist
-                if 'Dividends' in df.columns:
-                    cols.append('Dividends')
-                if 'Stock Splits' in df.columns:
-                    cols.append('Stock Splits')
+                if attempt < self.max_retries - 1:
+                    time.sleep(2 ** attempt)  # Exponential backoff
+                else:
+                    logger.error(f"Batch of {len(tickers)} tickers: All {self.max_retries} attempts failed")
+                    return {ticker: None for ticker in tickers}
+        
+        frames = {}
+        batch_tickers = (set(raw.columns.get_level_values(0))
+                         if isinstance(raw.columns, pd.MultiIndex) else set())
+        
+        for ticker in tickers:
+            if ticker in batch_tickers:
+                frames[ticker] = self._format_frame(ticker, raw.xs(ticker, axis=1, level=0))
+            elif not batch_tickers and len(tickers) == 1:
+                frames[ticker] = self._format_frame(ticker, raw)
+            else:
+                logger.warning(f"{ticker}: No data available")
+                frames[ticker] = None
+        
+        return frames
+    
+    def _parse_chart(self, ticker, payload):
+        """
+        Convert a Yahoo chart API response into a yfinance-style history frame.
+        
+        Prices are adjusted for splits and dividends the way yfinance's
+        auto_adjust does (OHLC scaled by Adj Close / Close).
+        
+        Args:
+            ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            payload (dict): Decoded JSON response
+            
+        Returns:
+            pd.DataFrame or None: History indexed by Date, or None if empty
+        """
+        result = (payload.get('chart') or {}).get('result') or []
+        if not result or not result[0].get('timestamp'):
+            return None
+        result = result[0]
+        
+        timezone = result['meta'].get('exchangeTimezoneName', 'Asia/Kolkata')
+        dates = (pd.to_datetime(result['timestamp'], unit='s', utc=True)
+                 .tz_convert(timezone).normalize().as_unit('ns').rename('Date'))
+        
+        quote = result['indicators']['quote'][0]
+        df = pd.DataFrame({
+            'Open': quote['open'],
+            'High': quote['high'],
+            'Low': quote['low'],
+            'Close': quote['close'],
+            'Volume': quote['volume']
+        }, index=dates, dtype='float64')
+        
+        # Adjust for splits and dividends
+        adjclose = result['indicators'].get('adjclose')
+        if adjclose:
+            adj_close = pd.Series(adjclose[0]['adjclose'], index=dates, dtype='float64')
+            ratio = adj_close / df['Close']
+            df[['Open', 'High', 'Low']] = df[['Open', 'High', 'Low']].mul(ratio, axis=0)
+            df['Close'] = adj_close
+        
+        if not self.include_actions:
+            return df
+        
+        # Include dividends and splits
+        events = result.get('events', {})
+        df['Dividends'] = 0.0
+        df['Stock Splits'] = 0.0
+        for event in events.get('dividends', {}).values():
+            event_date = pd.Timestamp(event['date'], unit='s', tz='UTC').tz_convert(timezone).normalize()
+            if event_date in df.index:
+                df.loc[event_date, 'Dividends'] = event['amount']
+        for event in events.get('splits', {}).values():
+            event_date = pd.Timestamp(event['date'], unit='s', tz='UTC').tz_convert(timezone).normalize()
+            if event_date in df.index:
+                df.loc[event_date, 'Stock Splits'] = event['numerator'] / event['denominator']
+        
+        return df
+    
+    async def _fetch(self, client, ticker, limiter, start=None):
+        """
+        Download one ticker from the Yahoo chart API with retry logic.
+        
+        Args:
+            client (httpx.AsyncClient): Shared HTTP client
+            ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            limiter (AsyncLimiter): Shared request rate limiter
+            start (str): First date to download (defaults to start_date)
+            
+        Returns:
+            pd.DataFrame or None: Historical data or None if failed
+        """
+        params = {
+            'period1': int(pd.Timestamp(start or self.start_date).timestamp()),
+            'period2': int(pd.Timestamp(self.end_date).timestamp()),
+            'interval': '1d',
+            'includeAdjustedClose': 'true'
+        }
+        if self.include_actions:
+            params['events'] = 'div,splits'
+        
+        for attempt in range(self.max_retries):
+            try:
+                async with limiter:
+                    response = await client.get(YAHOO_CHART_URL.format(ticker=ticker), params=params)
                 
-                # Select available columns
-                available_cols = [col for col in cols if col in df.columns]
-                df = df[available_cols]
+                # Unknown symbols come back as 404 with an error payload
+                if response.status_code == 404:
+                    logger.warning(f"{ticker}: No data available")
+                    return None
+                response.raise_for_status()
                 
-                logger.info(f"{ticker}: Downloaded {len(df)} records from "
-                          f"{df['Date'].min().date()} to {df['Date'].max().date()}")
+                history = self._parse_chart(ticker, response.json())
+                if history is None:
+                    logger.warning(f"{ticker}: No data available")
+                    return None
                 
-                return df
+                return self._format_frame(ticker, history)
                 
             except Exception as e:
                 logger.warning(f"{ticker}: Attempt {attempt + 1} failed - {e}")
                 
                 if attempt < self.max_retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
+                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
                 else:
                     logger.error(f"{ticker}: All {self.max_retries} attempts failed")
                     return None
         
         return None
     
-    def download_all(self, tickers):
+    async def _download_async(self, tickers, plans, on_result):
+        """
+        Download all tickers concurrently with bounded concurrency.
+        
+        Args:
+            tickers (list): List of ticker symbols
+            plans (dict): Ticker symbol -> (cached history, start date), see _cache_plan
+            on_result (callable): Called with (ticker, frame or None) as each
+                download finishes
+        """
+        semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+        limiter = AsyncLimiter(ASYNC_RATE_LIMIT, 1)
+        
+        # Keep a warm connection for every request that can be in flight
+        limits = httpx.Limits(max_connections=ASYNC_CONCURRENCY,
+                              max_keepalive_connections=ASYNC_CONCURRENCY)
+        
+        async with httpx.AsyncClient(headers=HTTP_HEADERS, timeout=30, limits=limits) as client:
+            async def run(ticker):
+                cached, start = plans[ticker]
+                async with semaphore:
+                    df = await self._fetch(client, ticker, limiter, start)
+                    if cached is not None:
+                        df = self._merge_cached(ticker, cached, df)
+                        if df is None:
+                            df = await self._fetch(client, ticker, limiter)
+                on_result(ticker, self._store(ticker, df))
+            
+            await asyncio.gather(*(run(ticker) for ticker in tickers))
+    
+    def _cache_plan(self, ticker):
+        """
+        Decide how much of a ticker's history has to be downloaded.
+        
+        Args:
+            ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            
+        Returns:
+            tuple: (cached history or None, date to download from, or None
+            when the cached history already covers the request)
+        """
+        entry = (self.cache.load(ticker, self.start_date, self.include_actions)
+                 if self.cache is not None else None)
+        if entry is None:
+            return None, self.start_date
+        
+        cached, meta = entry
+        if (pd.Timestamp(self.end_date) <= pd.Timestamp(meta['last_date'])
+                or self.cache.is_fresh(meta, self.end_date)):
+            return cached, None
+        
+        # The last cached bar is downloaded again to detect re-adjusted history
+        return cached, meta['last_date']
+    
+    def _last_dates(self, dataset_path):
+        """
+        Read the last stored Date of every ticker in the raw data dataset.
+        
+        Only the Parquet footers are read (row group statistics); no rows are
+        loaded.
+        
+        Args:
+            dataset_path (Path): Dataset directory
+            
+        Returns:
+            dict: Ticker symbol (without .NS) -> last Date (pd.Timestamp)
+        """
+        if not dataset_path.is_dir():
+            return {}
+        
+        dataset = ds.dataset(dataset_path, format='parquet', partitioning='hive')
+        timezone = dataset.schema.field('Date').type.tz
+        
+        last_dates = {}
+        for fragment in dataset.get_fragments():
+            ticker = ds.get_partition_keys(fragment.partition_expression)['Ticker']
+            metadata = fragment.metadata
+            column = metadata.schema.to_arrow_schema().get_field_index('Date')
+            
+            for i in range(metadata.num_row_groups):
+                statistics = metadata.row_group(i).column(column).statistics
+                if statistics is None or not statistics.has_min_max:
+                    # No statistics: fall back to reading the Date column
+                    last = fragment.to_table(columns=['Date']).column('Date').to_pandas().max()
+                else:
+                    last = pd.Timestamp(statistics.max)
+                
+                if timezone is not None:
+                    last = last.tz_convert(timezone)
+                if ticker not in last_dates or last > last_dates[ticker]:
+                    last_dates[ticker] = last
+        
+        return last_dates
+    
+    def _update_plan(self, last_date):
+        """
+        Decide how much of a ticker's history update mode has to download.
+        
+        Args:
+            last_date (pd.Timestamp or None): Last stored Date of the ticker
+            
+        Returns:
+            tuple: (None, date to download from, or None when the stored
+            history already reaches end_date), in the form of _cache_plan
+        """
+        if last_date is None:
+            return None, self.start_date
+        
+        next_day = last_date.tz_localize(None).normalize() + timedelta(days=1)
+        if next_day >= pd.Timestamp(self.end_date):
+            return None, None
+        
+        # Start at the last stored bar so every request returns data and the
+        # stored history can be checked against it (see _extend_partition)
+        return None, last_date.strftime('%Y-%m-%d')
+    
+    def _extend_partition(self, ticker, fresh, stored_dataset):
+        """
+        Update mode: combine newly downloaded bars with a ticker's stored history.
+        
+        The combined history replaces the partition as a single file, so
+        repeated updates do not accumulate files. As with the cache, the
+        re-downloaded last stored bar must match; otherwise the stored
+        history was re-adjusted and the full history is downloaded instead.
+        
+        Args:
+            ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            fresh (pd.DataFrame): Bars from the last stored date on
+            stored_dataset (ds.Dataset): The raw data dataset as it was before
+                this run
+            
+        Returns:
+            tuple: (history to write, bars in it that were not stored before,
+            empty if there are none), or (None, None) if the re-adjusted
+            history could not be downloaded again
+        """
+        symbol = ticker.replace('.NS', '')
+        stored = stored_dataset.to_table(filter=ds.field('Ticker') == symbol).to_pandas()
+        stored['Ticker'] = symbol
+        stored = stored.sort_values('Date', ignore_index=True)
+        
+        history = self._merge_cached(ticker, stored, fresh)
+        if history is None:
+            history = self.download_ticker(ticker)
+            if history is None or history.empty:
+                logger.error(f"{ticker}: Re-adjusted history could not be downloaded, "
+                             f"keeping the stored partition")
+                return None, None
+            return history, history
+        
+        return history, history.iloc[len(stored):]
+    
+    def _merge_cached(self, ticker, cached, fresh):
+        """
+        Append newly downloaded bars to a cached history.
+        
+        Adjusted prices change retroactively after dividends and splits, so
+        the overlapping bar must match the cached one.
+        
+        Args:
+            ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            cached (pd.DataFrame): Cached history
+            fresh (pd.DataFrame or None): Bars from the last cached date on
+            
+        Returns:
+            pd.DataFrame or None: Combined history, or None if the full
+            history has to be downloaded again
+        """
+        if fresh is None or fresh.empty:
+            logger.warning(f"{ticker}: No new bars downloaded, using cached history")
+            return cached
+        
+        last_date = cached['Date'].iloc[-1]
+        overlap = fresh.loc[fresh['Date'] == last_date, 'Close']
+        
+        if overlap.empty or not np.isclose(overlap.iloc[0], cached['Close'].iloc[-1], equal_nan=True):
+            logger.info(f"{ticker}: Saved history was re-adjusted, downloading it again")
+            return None
+        
+        return pd.concat([cached, fresh[fresh['Date'] > last_date]], ignore_index=True)
+    
+    def _store(self, ticker, df):
+        """
+        Write a downloaded history to the cache.
+        
+        Args:
+            ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            df (pd.DataFrame or None): Full history
+            
+        Returns:
+            pd.DataFrame or None: The same history
+        """
+        if self.cache is not None and df is not None and not df.empty:
+            self.cache.save(ticker, df, self.start_date, self.include_actions, self.end_date)
+        
+        return df
+    
+    def _slice_to_end(self, df):
+        """
+        Restrict a cached history to dates before end_date (exclusive, like yfinance).
+        
+        Args:
+            df (pd.DataFrame): History with a Date column
+            
+        Returns:
+            pd.DataFrame: Bars before end_date
+        """
+        end = pd.Timestamp(self.end_date, tz=df['Date'].dt.tz)
+        return df[df['Date'] < end].reset_index(drop=True)
+    
+    def download_ticker(self, ticker):
+        """
+        Download historical data for a single ticker with retry logic.
+        
+        Args:
+            ticker (str): Ticker symbol (e.g., 'RELIANCE.NS')
+            
+        Returns:
+            pd.DataFrame or None: Historical data or None if failed
+        """
+        return self.download_batch([ticker])[ticker]
+    
+    def download_all(self, tickers, frame_queue=None, stream_to_disk=False):
         """
         Download historical data for all tickers with progress tracking.
         
+        With the yfinance engine tickers are requested in batches of
+        chunk_size per yf.download call; the async engine issues up to
+        ASYNC_CONCURRENCY chart requests at once, capped at ASYNC_RATE_LIMIT
+        requests per second; the pool engine spreads the batches over
+        POOL_PROCESSES worker processes. With the cache enabled only the bars
+        after each ticker's cached history are downloaded.
+        
         Args:
             tickers (list): List of ticker symbols
+            frame_queue (queue.Queue): If given, each ticker's frame is put on
+                this queue as soon as it is downloaded instead of being kept
+            stream_to_disk (bool): Write each ticker's frame to its partition of
+                the raw data dataset as soon as it is downloaded, so at most
+                one ticker is held in memory (replaces any previous snapshot
+                once data was downloaded, unless update_mode is set)
             
         Returns:
-            pd.DataFrame: Combined dataset with all downloaded data
+            pd.DataFrame, Path or None: Combined dataset with all downloaded
+            data, the dataset path when streaming to disk (None if nothing
+            was downloaded), or None when frames are streamed to frame_queue
         """
+        if frame_queue is not None and stream_to_disk:
+            raise ValueError("frame_queue and stream_to_disk cannot be combined")
+        
+        if self.update_mode and not stream_to_disk:
+            raise ValueError("update_mode requires stream_to_disk")
+        
         self.stats['total_tickers'] = len(tickers)
         
         logger.info("=" * 70)
@@ -178,50 +852,248 @@ class NIFTY500Downloader:
         
         all_data = []
         
-        # Download with progress bar
-        with tqdm(total=len(tickers), desc="Downloading", unit="ticker") as pbar:
-            for ticker in tickers:
-                df = self.download_ticker(ticker)
+        last_dates = {}
+        
+        if stream_to_disk:
+            dataset_path = self.raw_data_dir / RAW_DATASET_NAME
+            if self.update_mode:
+                # Stored partitions are extended in place
+                write_path = dataset_path
+                stored = self._last_dates(dataset_path)
+                last_dates = {ticker: stored[ticker.replace('.NS', '')] for ticker in tickers
+                              if ticker.replace('.NS', '') in stored}
+                if last_dates:
+                    # Opened once, before any partition is rewritten
+                    stored_dataset = ds.dataset(dataset_path, format='parquet', partitioning='hive')
+            else:
+                # Written to a staging directory and swapped in at the end,
+                # so a run that downloads nothing keeps the previous snapshot
+                write_path = self._staging_path(dataset_path)
+        
+        if self.update_mode:
+            plans = {ticker: self._update_plan(last_dates.get(ticker)) for ticker in tickers}
+        else:
+            plans = {ticker: self._cache_plan(ticker) for ticker in tickers}
+        pending = [ticker for ticker in tickers if plans[ticker][1] is not None]
+        
+        if self.cache is not None:
+            logger.info(f"Cache: {len(tickers) - len(pending)} tickers up to date, "
+                        f"{len(pending)} to download")
+        elif self.update_mode:
+            logger.info(f"Update: {len(last_dates)} tickers already stored, "
+                        f"{len(tickers) - len(pending)} up to date, {len(pending)} to download")
+        
+        # Download with progress bar (repaints throttled to twice a second;
+        # cached tickers complete in a burst and batches land all at once)
+        with tqdm(total=len(tickers), desc="Downloading", unit="ticker",
+                  mininterval=0.5, smoothing=0) as pbar:
+            def record(ticker, df, up_to_date=False):
+                history = df
+                if df is not None and ticker in last_dates:
+                    # Update mode: the partition is rewritten with the whole
+                    # history, but only the bars after the stored one count
+                    history, df = self._extend_partition(ticker, df, stored_dataset)
+                    up_to_date = df is not None and df.empty
                 
                 if df is not None and not df.empty:
-                    all_data.append(df)
+                    if frame_queue is not None:
+                        frame_queue.put(df)
+                    elif stream_to_disk:
+                        self._write_partition(history, write_path)
+                    else:
+                        all_data.append(df)
+                    self.stats['successful'] += 1
+                    self.stats['records'] += len(df)
+                elif up_to_date:
                     self.stats['successful'] += 1
                 else:
                     self.stats['failed'] += 1
                     self.stats['failed_tickers'].append(ticker)
                 
                 pbar.update(1)
+            
+            # Tickers whose cached (or in update mode, stored) history covers
+            # the request are not downloaded
+            for ticker in tickers:
+                cached, start = plans[ticker]
+                if start is None and cached is not None:
+                    record(ticker, self._slice_to_end(cached))
+                elif start is None:
+                    record(ticker, None, up_to_date=True)
+            
+            if self.engine == 'async':
+                asyncio.run(self._download_async(pending, plans, record))
+            else:
+                # Batch tickers that need the same date range
+                by_start = {}
+                for ticker in pending:
+                    by_start.setdefault(plans[ticker][1], []).append(ticker)
+                
+                batches = [(start, group[i:i + self.chunk_size])
+                           for start, group in by_start.items()
+                           for i in range(0, len(group), self.chunk_size)]
                 
-                # Rate limiting to avoid being blocked
-                time.sleep(0.5)
+                if self.engine == 'pool':
+                    results = self._download_batches_pool(batches)
+                else:
+                    results = ((batch, self.download_batch(batch, start=start))
+                               for start, batch in batches)
+                
+                for batch, frames in results:
+                    for ticker in batch:
+                        df = frames.get(ticker)
+                        cached = plans[ticker][0]
+                        if cached is not None:
+                            df = self._merge_cached(ticker, cached, df)
+                            if df is None:
+                                df = self.download_ticker(ticker)
+                        record(ticker, self._store(ticker, df))
         
         self.stats['download_end'] = datetime.now()
         
+        if frame_queue is not None:
+            logger.info(f"Streamed data for {self.stats['successful']} tickers")
+            return None
+        
+        if stream_to_disk and not self.update_mode:
+            if not write_path.is_dir():
+                logger.error(f"No data downloaded for any ticker; keeping {dataset_path}/")
+                return None
+            self._swap_in(write_path, dataset_path)
+        
+        if stream_to_disk:
+            logger.info(f"Wrote data for {self.stats['successful']} tickers to {dataset_path}/")
+            return dataset_path
+        
         # Combine all dataframes
         if all_data:
-            combined_df = pd.concat(all_data, ignore_index=True)
-            logger.info(f"Successfully downloaded data for {len(all_data)} tickers")
+            ticker_count = len(all_data)
+            combined_df = _tree_concat(all_data)
+            # One small integer code per row instead of a string per row
+            combined_df['Ticker'] = combined_df['Ticker'].astype('category')
+            logger.info(f"Successfully downloaded data for {ticker_count} tickers")
             return combined_df
         else:
             logger.error("No data downloaded for any ticker")
             return pd.DataFrame()
     
-    def save_raw_data(self, df, filename='nifty500_raw_data.csv'):
+    def _download_batches_pool(self, batches):
+        """
+        Download batches in worker processes, yielding them as they finish.
+        
+        Each worker builds its own downloader (HTTP session and rate limiter)
+        and sends the formatted frames back; caching and writing stay in this
+        process.
+        
+        Args:
+            batches (list): (start date, ticker list) pairs
+            
+        Yields:
+            tuple: (ticker list, dict of ticker symbol -> pd.DataFrame or None)
+        """
+        if not batches:
+            return
+        
+        processes = min(POOL_PROCESSES, len(batches))
+        config = {
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'raw_data_dir': str(self.raw_data_dir),
+            'max_retries': self.max_retries,
+            'chunk_size': self.chunk_size,
+            'use_cache': False,
+            'include_actions': self.include_actions
+        }
+        
+        logger.info(f"Downloading {len(batches)} batches in {processes} processes")
+        
+        with multiprocessing.Pool(processes, initializer=_init_pool_worker,
+                                  initargs=(config, DOWNLOAD_RATE_LIMIT / processes)) as pool:
+            yield from pool.imap_unordered(_download_batch_in_worker, batches)
+    
+    def _write_partition(self, df, dataset_path):
+        """
+        Write one or more tickers' frames to their Ticker partitions,
+        replacing the partitions' existing files.
+        
+        Args:
+            df (pd.DataFrame): Downloaded data
+            dataset_path (Path): Dataset directory
+        """
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        
+        # Volume is uint32, int64 or float (alignment NaNs) depending on the
+        # ticker; one type on disk keeps all partition files readable as a
+        # single dataset (NaN is stored as null)
+        if 'Volume' in table.column_names:
+            table = table.set_column(
+                table.schema.get_field_index('Volume'), 'Volume',
+                pa.array(df['Volume'].to_numpy(), type=pa.int64(), from_pandas=True)
+            )
+        
+        pq.write_to_dataset(
+            table,
+            root_path=dataset_path,
+            partition_cols=['Ticker'],
+            compression='zstd',
+            existing_data_behavior='delete_matching'
+        )
+    
+    def _staging_path(self, dataset_path):
+        """
+        Return an empty staging directory path next to a dataset.
+        
+        Args:
+            dataset_path (Path): Dataset directory
+            
+        Returns:
+            Path: Staging directory (not created; any leftover is removed)
+        """
+        staging_path = dataset_path.with_name(dataset_path.name + '.tmp')
+        shutil.rmtree(staging_path, ignore_errors=True)
+        return staging_path
+    
+    def _swap_in(self, staging_path, dataset_path):
         """
-        Save raw downloaded data to CSV.
+        Replace a dataset with a fully written staging directory.
+        
+        Args:
+            staging_path (Path): Staging directory
+            dataset_path (Path): Dataset directory
+        """
+        shutil.rmtree(dataset_path, ignore_errors=True)
+        staging_path.rename(dataset_path)
+    
+    def save_raw_data(self, df, dataset_name=RAW_DATASET_NAME):
+        """
+        Save raw downloaded data as a Parquet dataset partitioned by Ticker
+        (pyarrow, zstd compression).
+        
+        Each ticker is written to its own Ticker=<symbol>/ directory, so
+        readers can load a subset of tickers or columns without scanning
+        the whole file. Any previous snapshot is replaced once the new one
+        is fully written.
         
         Args:
             df (pd.DataFrame): Combined dataset
-            filename (str): Output filename
+            dataset_name (str): Dataset directory name under raw_data_dir
             
         Returns:
-            Path: Path to saved file
+            Path or None: Path to the dataset directory, or None if df is
+            empty (the previous snapshot is kept)
         """
-        output_path = self.raw_data_dir / filename
-        df.to_csv(output_path, index=False)
+        output_path = self.raw_data_dir / dataset_name
+        
+        if df is None or df.empty:
+            logger.warning(f"No raw data to save; keeping {output_path}/")
+            return None
         
-        file_size_mb = output_path.stat().st_size / (1024 * 1024)
-        logger.info(f"Saved raw data to {output_path} ({file_size_mb:.2f} MB)")
+        staging_path = self._staging_path(output_path)
+        self._write_partition(df, staging_path)
+        self._swap_in(staging_path, output_path)
+        
+        dataset_size_mb = sum(f.stat().st_size for f in output_path.rglob('*.parquet')) / (1024 * 1024)
+        logger.info(f"Saved raw data to {output_path}/ ({dataset_size_mb:.2f} MB)")
         
         return output_path
     
@@ -230,7 +1102,7 @@ class NIFTY500Downloader:
         Save download statistics and failed tickers report.
         """
         report_dir = Path('data/reports')
-        report_dir.mkdir(parents=True, exist_ok=True)
+        ensure_dirs((str(report_dir),))
         
         # Calculate duration
         duration = self.stats['download_end'] - self.stats['download_start']
@@ -281,6 +1153,50 @@ class NIFTY500Downloader:
         logger.info("=" * 70)
 
 
+# Downloader of a pool engine worker process (set by _init_pool_worker)
+_pool_downloader = None
+
+
+def _init_pool_worker(config, rate_limit):
+    """
+    Create the downloader used by one pool engine worker process.
+    
+    Args:
+        config (dict): NIFTY500Downloader keyword arguments
+        rate_limit (float): This worker's share of yf.download calls per second
+    """
+    global _pool_downloader
+    
+    # Records buffered by the parent before a fork are written by the parent
+    buffered_file_handler.acquire()
+    try:
+        buffered_file_handler.buffer.clear()
+    finally:
+        buffered_file_handler.release()
+    
+    _pool_downloader = NIFTY500Downloader(**config)
+    _pool_downloader.rate_limiter = TokenBucket(rate_limit)
+
+
+def _download_batch_in_worker(job):
+    """
+    Download one batch in a pool engine worker process.
+    
+    Args:
+        job (tuple): (start date, ticker list)
+        
+    Returns:
+        tuple: (ticker list, dict of ticker symbol -> pd.DataFrame or None)
+    """
+    start, batch = job
+    frames = _pool_downloader.download_batch(batch, start=start)
+    
+    # Pool workers are terminated without running atexit handlers
+    buffered_file_handler.flush()
+    
+    return batch, frames
+
+
 def main():
     """Main execution function."""
     logger.info("=" * 70)
@@ -298,13 +1214,10 @@ def main():
         # Load tickers
         tickers = downloader.load_tickers()
         
-        # Download all data
-        df = downloader.download_all(tickers)
+        # Download all data, writing each ticker to the raw dataset as it arrives
+        dataset_path = downloader.download_all(tickers, stream_to_disk=True)
         
-        if not df.empty:
-            # Save raw data
-            downloader.save_raw_data(df)
-            
+        if downloader.stats['successful'] > 0:
             # Save report
             downloader.save_download_report()
             
@@ -315,7 +1228,7 @@ def main():
             logger.info("SUCCESS: Data download completed")
             logger.info("=" * 70)
             
-            return df
+            return dataset_path
         else:
             logger.error("FAILED: No data downloaded")
             return None
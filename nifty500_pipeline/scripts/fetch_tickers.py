@@ -15,7 +15,12 @@ import requests
 import logging
 from pathlib import Path
 import json
-import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+import threading
+from io import BytesIO, StringIO
+
+from utils import ensure_dirs
 
 # Configure logging
 logging.basicConfig(
@@ -24,14 +29,88 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# A saved ticker list younger than this is reused instead of fetched again
+TICKER_CACHE_TTL = timedelta(days=1)
+
+NSE_CONSTITUENTS_URL = "https://www.niftyindices.com/IndexConstituent/ind_nifty500list.csv"
+WIKIPEDIA_URL = "https://en.wikipedia.org/wiki/NIFTY_500"
+
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+}
+
+
+@lru_cache(maxsize=1)
+def _fetch_nse_symbols():
+    """
+    Download the NIFTY 500 constituent CSV (memoized for the process).
+    
+    Failures raise, so they are not cached.
+    
+    Returns:
+        tuple: Ticker symbols
+    """
+    response = requests.get(NSE_CONSTITUENTS_URL, headers=REQUEST_HEADERS, timeout=30)
+    response.raise_for_status()
+    
+    # Parse CSV (the pyarrow engine reads the raw bytes without decoding first)
+    df = pd.read_csv(BytesIO(response.content), engine='pyarrow')
+    
+    # Extract symbols
+    if 'Symbol' not in df.columns:
+        raise ValueError("'Symbol' column not found in NSE data")
+    
+    return tuple(df['Symbol'].dropna().unique().tolist())
+
+
+@lru_cache(maxsize=1)
+def _fetch_wikipedia_symbols():
+    """
+    Parse the NIFTY 500 list from Wikipedia (memoized for the process).
+    
+    Failures raise, so they are not cached.
+    
+    Returns:
+        tuple: Ticker symbols (or company names if no Symbol column exists)
+    """
+    # Fetched with a timeout (read_html on a URL has none) so a stalled
+    # response cannot hang the process
+    response = requests.get(WIKIPEDIA_URL, headers=REQUEST_HEADERS, timeout=30)
+    response.raise_for_status()
+    
+    tables = pd.read_html(StringIO(response.text), flavor='lxml')
+    
+    # Find table with stock symbols
+    for table in tables:
+        if 'Symbol' in table.columns:
+            return tuple(table['Symbol'].dropna().unique().tolist())
+        if 'Company' in table.columns:
+            # Try to extract symbols from company names
+            return tuple(table['Company'].dropna().unique().tolist())
+    
+    raise ValueError("Could not find ticker table in Wikipedia")
+
 
 class NIFTY500Fetcher:
     """Fetches NIFTY 500 constituent tickers from multiple sources."""
     
-    def __init__(self, output_dir='data/raw'):
+    def __init__(self, output_dir='data/raw', use_cache=True):
+        """
+        Initialize the fetcher.
+        
+        Args:
+            output_dir (str): Directory for the ticker files
+            use_cache (bool): Reuse a ticker list saved within TICKER_CACHE_TTL
+        """
         self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        ensure_dirs((str(self.output_dir),))
+        self.use_cache = use_cache
         self.tickers = []
+        self.source = None
+        self.loaded_from_cache = False
         
     def fetch_from_nse_api(self):
         """
@@ -43,31 +122,9 @@ class NIFTY500Fetcher:
         try:
             logger.info("Attempting to fetch NIFTY 500 from NSE API...")
             
-            # NSE API endpoint for NIFTY 500 constituents
-            url = "https://www.niftyindices.com/IndexConstituent/ind_nifty500list.csv"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Connection': 'keep-alive',
-            }
-            
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            
-            # Parse CSV
-            from io import StringIO
-            df = pd.read_csv(StringIO(response.text))
-            
-            # Extract symbols
-            if 'Symbol' in df.columns:
-                tickers = df['Symbol'].dropna().unique().tolist()
-                logger.info(f"Successfully fetched {len(tickers)} tickers from NSE API")
-                return tickers
-            else:
-                logger.warning("'Symbol' column not found in NSE data")
-                return []
+            tickers = list(_fetch_nse_symbols())
+            logger.info(f"Successfully fetched {len(tickers)} tickers from NSE API")
+            return tickers
                 
         except Exception as e:
             logger.error(f"Failed to fetch from NSE API: {e}")
@@ -83,28 +140,31 @@ class NIFTY500Fetcher:
         try:
             logger.info("Attempting to fetch NIFTY 500 from Wikipedia...")
             
-            url = "https://en.wikipedia.org/wiki/NIFTY_500"
-            tables = pd.read_html(url)
-            
-            # Find table with stock symbols
-            for table in tables:
-                if 'Symbol' in table.columns or 'Company' in table.columns:
-                    if 'Symbol' in table.columns:
-                        tickers = table['Symbol'].dropna().unique().tolist()
-                    else:
-                        # Try to extract symbols from company names
-                        tickers = table['Company'].dropna().unique().tolist()
-                    
-                    logger.info(f"Successfully fetched {len(tickers)} tickers from Wikipedia")
-                    return tickers
-            
-            logger.warning("Could not find ticker table in Wikipedia")
-            return []
+            tickers = list(_fetch_wikipedia_symbols())
+            logger.info(f"Successfully fetched {len(tickers)} tickers from Wikipedia")
+            return tickers
             
         except Exception as e:
             logger.error(f"Failed to fetch from Wikipedia: {e}")
             return []
     
+    def _prefetch_wikipedia(self, outcome):
+        """
+        Speculatively fetch the Wikipedia list while NSE is queried.
+        
+        Failures are only logged at DEBUG here; fetch_tickers reports them
+        as errors if the Wikipedia list is actually needed.
+        
+        Args:
+            outcome (dict): Receives 'tickers' on success or 'error' on failure
+        """
+        try:
+            logger.debug("Speculatively fetching NIFTY 500 from Wikipedia...")
+            outcome['tickers'] = list(_fetch_wikipedia_symbols())
+        except Exception as e:
+            logger.debug(f"Speculative Wikipedia fetch failed: {e}")
+            outcome['error'] = e
+    
     def use_hardcoded_list(self):
         """
         Last resort: Use a hardcoded list of major NIFTY 500 companies.
@@ -136,24 +196,85 @@ class NIFTY500Fetcher:
         
         return major_stocks
     
+    def load_cached_tickers(self):
+        """
+        Load the saved ticker list if caching is enabled and it is fresh.
+        
+        The age comes from the 'fetched_at' field that save_tickers writes to
+        the JSON file, not from file timestamps (a fresh checkout gives every
+        file a new mtime). Lists from the hardcoded fallback have no
+        'fetched_at' and are never reused.
+        
+        Returns:
+            list or None: Formatted ticker symbols, or None if not usable
+        """
+        json_path = self.output_dir / 'nifty500_tickers.json'
+        
+        if not self.use_cache or not json_path.exists():
+            return None
+        
+        try:
+            with open(json_path) as f:
+                saved = json.load(f)
+            
+            if not saved.get('fetched_at'):
+                return None
+            
+            fetched_at = datetime.fromisoformat(saved['fetched_at'])
+            if datetime.now() - fetched_at > TICKER_CACHE_TTL:
+                return None
+            
+            tickers = saved['tickers']
+            if not all(isinstance(ticker, str) and ticker for ticker in tickers):
+                return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable ticker cache {json_path}: {e}")
+            return None
+        
+        return list(tickers) or None
+    
     def fetch_tickers(self):
         """
         Main method to fetch NIFTY 500 tickers with fallback logic.
         
+        A ticker list saved within TICKER_CACHE_TTL is returned without any
+        network request (see loaded_from_cache).
+        
         Returns:
             list: List of ticker symbols formatted for Yahoo Finance (.NS suffix)
         """
-        # Try NSE API first
+        cached = self.load_cached_tickers()
+        self.loaded_from_cache = cached is not None
+        if cached is not None:
+            logger.info(f"Using cached tickers from {self.output_dir / 'nifty500_tickers.csv'}")
+            return cached
+        
+        # Query NSE and Wikipedia concurrently. NSE is preferred: when it
+        # succeeds the Wikipedia result is discarded. The request runs on a
+        # daemon thread, so an unfinished one never delays process exit
+        wikipedia = {}
+        prefetch = threading.Thread(
+            target=self._prefetch_wikipedia, args=(wikipedia,),
+            name='wikipedia', daemon=True
+        )
+        prefetch.start()
+        
         self.tickers = self.fetch_from_nse_api()
+        self.source = 'nse'
         
-        # Fallback to Wikipedia if NSE fails
         if not self.tickers:
-            time.sleep(2)  # Rate limiting
-            self.tickers = self.fetch_from_wikipedia()
+            prefetch.join()
+            if 'error' in wikipedia:
+                logger.error(f"Failed to fetch from Wikipedia: {wikipedia['error']}")
+            else:
+                self.tickers = wikipedia['tickers']
+                logger.info(f"Successfully fetched {len(self.tickers)} tickers from Wikipedia")
+            self.source = 'wikipedia'
         
         # Last resort: hardcoded list
         if not self.tickers:
             self.tickers = self.use_hardcoded_list()
+            self.source = 'hardcoded'
         
         if not self.tickers:
             raise ValueError("Failed to fetch NIFTY 500 tickers from all sources")
@@ -169,6 +290,10 @@ class NIFTY500Fetcher:
         """
         Save fetched tickers to CSV and JSON files.
         
+        The JSON file records the fetch time used by load_cached_tickers.
+        It is left empty for the hardcoded fallback list, so that the next
+        run tries the web sources again.
+        
         Args:
             tickers (list): List of formatted ticker symbols
         """
@@ -180,8 +305,15 @@ class NIFTY500Fetcher:
         
         # Save to JSON
         json_path = self.output_dir / 'nifty500_tickers.json'
+        fetched_at = None if self.source == 'hardcoded' else datetime.now().isoformat()
+        metadata = {
+            'tickers': tickers,
+            'count': len(tickers),
+            'source': self.source,
+            'fetched_at': fetched_at,
+        }
         with open(json_path, 'w') as f:
-            json.dump({'tickers': tickers, 'count': len(tickers)}, f, indent=2)
+            json.dump(metadata, f, indent=2)
         logger.info(f"Saved ticker metadata to {json_path}")
         
         return csv_path
@@ -199,8 +331,10 @@ def main():
         # Fetch tickers
         tickers = fetcher.fetch_tickers()
         
-        # Save to files
-        csv_path = fetcher.save_tickers(tickers)
+        # Save to files (a cached list is left untouched so its age is kept)
+        csv_path = fetcher.output_dir / 'nifty500_tickers.csv'
+        if not fetcher.loaded_from_cache:
+            csv_path = fetcher.save_tickers(tickers)
         
         logger.info("=" * 70)
         logger.info(f"SUCCESS: Fetched and saved {len(tickers)} NIFTY 500 tickers")
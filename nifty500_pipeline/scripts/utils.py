@@ -0,0 +1,99 @@
+"""
+Shared Helpers
+==============
+
+Small process-wide utilities used by the pipeline stages.
+"""
+
+import random
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+
+@lru_cache(maxsize=None)
+def ensure_dirs(paths):
+    """
+    Create directories once per process.
+
+    Repeated calls with the same tuple are served from the cache, so stage
+    constructors can declare the directories they need without re-issuing
+    mkdir/stat calls.
+
+    Args:
+        paths (tuple): Directory paths (str) to create, parents included
+
+    Returns:
+        tuple: The created directories as Path objects
+    """
+    directories = tuple(Path(path) for path in paths)
+
+    for directory in directories:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    return directories
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter with an adaptive rate.
+
+    consume() only sleeps once the burst allowance is used up. penalize()
+    halves the rate after the server signals throttling, and reward() wins
+    it back gradually (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, rate, per=1.0, jitter=0.2):
+        """
+        Initialize the bucket.
+
+        Args:
+            rate (float): Tokens granted per period (also the burst size)
+            per (float): Period length in seconds
+            jitter (float): Upper bound of the random delay (seconds) added to
+                each wait, so concurrent clients do not retry in lockstep
+        """
+        self.max_rate = rate / per
+        self.min_rate = self.max_rate / 16
+        self.rate = self.max_rate
+        self.capacity = max(1.0, float(rate))
+        self.tokens = self.capacity
+        self.jitter = jitter
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, tokens=1):
+        """
+        Take tokens from the bucket, blocking until enough are available.
+
+        Args:
+            tokens (float): Tokens to take
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait + random.uniform(0, self.jitter))
+
+    def penalize(self):
+        """Halve the rate (down to 1/16 of the initial rate) and drain the bucket."""
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+
+    def reward(self):
+        """Raise the rate by a tenth of the initial rate after a success."""
+        with self.lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)